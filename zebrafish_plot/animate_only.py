@@ -12,6 +12,8 @@ import math
 import os
 import imageio
 
+from tools import exporters
+
 
 if __name__ == '__main__':
 
@@ -20,6 +22,9 @@ if __name__ == '__main__':
     basepath = '/home/chris/projects/difgrow_mc_sims/'
     datepath = '20_01_21/'  # For now I'll have to change this manually. Will iterate through each sim run per day though
     dirPath = basepath + datepath
+    animName = 'Animation.gif'  # Use .mp4 (or another video container) for much smaller files of long runs
+    stride = 1  # Only every stride-th image goes into the animation
+    maxFrames = None  # If set, the stride is raised so no more than this many images are used
     for item in os.listdir(dirPath):
         fullSimPath = dirPath + item
         if os.path.isdir(fullSimPath):
@@ -30,17 +35,13 @@ if __name__ == '__main__':
         # Check and then load Image directory
         imgDir = sim + 'Images/'
         if os.path.isdir(imgDir):
-            animateList = []
+            imgList = [img for img in sorted(os.listdir(imgDir)) if (img.endswith('png') and not img.startswith('SpaceTimePlot'))]
 
-            # Read in all of the images
-            for img in sorted(os.listdir(imgDir)):
-                if (img.endswith('png') and not img.startswith('SpaceTimePlot')):
+            # Read the images in one at a time and stream them into the animation, so they're never all in memory
+            with exporters.open_animation(imgDir + animName, fps = 50) as writer:
+                for img in exporters.decimate(imgList, stride, maxFrames):
                     imgPath = imgDir + img
-                    animateList.append(imageio.imread(imgPath))
-            
-            # Make and save animation
-            animFile = imgDir + 'Animation.gif'
-            imageio.mimwrite(animFile, animateList, fps = 50)
+                    writer.append_rgb(imageio.imread(imgPath, pilmode = 'RGB'))
         
         else:
             print("Failure: no image file exists. Use zebrafish_plot.py to create images")
\ No newline at end of file
@@ -0,0 +1,252 @@
+"""
+This script times the plotting pipeline, so we can tell whether a change made things faster or slower.
+
+Run it from this folder (the same way as zebrafish_plot.py). It makes its own fake simulations (see tools/synthetic.py),
+so no simulation output is needed. Each stage of the pipeline (import from .csv or a frame pack, render, .png export, animation export, space-time plots)
+is timed on its own, and its throughput and peak memory are reported. 'canvas' is rendering into one reused canvas (plotters.FrameCanvas).
+'png' is encoding every frame with the render cache off, and 'png_cached' is writing the same frames again once they're in the cache (see tools/rendercache.py).
+It also times how long a fresh Python takes to import each module of tools (what every worker process pays before it does anything),
+and checks that none of them pull in matplotlib.pyplot, which is only meant to be imported for the styled figures.
+Save the results with --save, and compare a later run against them with --compare:
+    python benchmark.py --save baseline.json
+    python benchmark.py --compare baseline.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+import numpy as np
+
+from tools import importers, plotters, exporters, STPlotter, synthetic, framepack, rendercache
+
+
+def loop_plot(sim_array, final_size, row_shift, col_shift):
+    """This function is the old per-pixel loop the plotters used, kept here as a reference to check and time the new renderer against"""
+    plot_array = np.zeros((final_size[0], final_size[1], 3))
+    plot_array[:, :, 2] = np.ones(final_size)
+    for i in range(sim_array.shape[0]):
+        for j in range(sim_array.shape[1]):
+            if sim_array[i, j] == 0:
+                plot_array[i + row_shift, j + col_shift, :] = [1, 1, 1]
+            elif sim_array[i, j] == 1:
+                plot_array[i + row_shift, j + col_shift, :] = [1, 1, 0]
+            elif sim_array[i, j] == 2:
+                plot_array[i + row_shift, j + col_shift, :] = [0, 0, 0]
+    return plot_array
+
+
+STARTUP_MODULES = ('importers', 'plotters', 'exporters', 'STPlotter', 'stats', 'batch', 'sweep', 'watch')
+STARTUP_SCRIPT = """
+import sys, time, json
+start = time.perf_counter()
+import tools.%s
+print(json.dumps({'seconds': time.perf_counter() - start, 'pyplot': 'matplotlib.pyplot' in sys.modules}))
+"""
+
+
+def time_call(func, *args, repeats = 3):
+    """This function returns the best wall time (in seconds) out of a few calls of func"""
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(func, *args):
+    """This function returns the peak memory (in bytes) allocated while func runs, as seen by tracemalloc (numpy arrays included)"""
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_render(final_size = (200, 800), sim_cols = 600):
+    """This function compares the old loop to plotters.render_frame for every placement, and checks they give the same pixels"""
+    sim_array = np.random.randint(0, 3, size=(final_size[0], sim_cols)).astype(float)
+    print("Rendering a %d x %d frame into a %d x %d canvas" % (sim_array.shape + tuple(final_size)))
+    for placement in plotters.PLACEMENTS:
+        row_shift, col_shift = plotters.placement_offset(sim_array.shape, final_size, placement)
+        reference = loop_plot(sim_array, final_size, row_shift, col_shift)
+        rendered = plotters.render_frame(sim_array, final_size, placement)
+        if not np.array_equal(reference, rendered):
+            print("Error: render_frame output does not match the loop for placement " + placement)
+
+        loop_time = time_call(loop_plot, sim_array, final_size, row_shift, col_shift, repeats = 1)
+        fast_time = time_call(plotters.render_frame, sim_array, final_size, placement)
+        print("  %-10s loop: %8.4f s   vectorized: %8.4f s   speedup: %6.1fx" % (placement, loop_time, fast_time, loop_time / fast_time))
+
+
+def bench_png(final_size = (200, 800), n_frames = 10):
+    """This function compares frames per second of the direct .png writer against the matplotlib styled figures"""
+    frames = [plotters.render_indexed(np.random.randint(0, 3, size=final_size), final_size) for _ in range(n_frames)]
+    print("Saving %d frames of %d x %d" % ((n_frames,) + tuple(final_size)))
+    with tempfile.TemporaryDirectory() as outDir:
+        for name, writer in [('direct', exporters.write_png), ('styled', exporters.write_styled_png)]:
+            start = time.perf_counter()
+            for k, frame in enumerate(frames):
+                writer(os.path.join(outDir, '%s_%04d.png' % (name, k)), frame)
+            elapsed = time.perf_counter() - start
+            print("  %-7s %8.1f frames/s" % (name, n_frames / elapsed))
+
+
+def pipeline_stages(simpath, outDir, placement = 'grow_right'):
+    """
+    This function sets up every stage of the pipeline on the simulation in simpath, each as a function that runs it over all of the frames.
+    Frames are imported once up front, so every stage after import is timed on its own. Returns (stages, frames, final_size).
+    """
+    img_list = importers.pull_images(simpath)
+    paths = [os.path.join(simpath, name) for name in img_list]
+    frames = [importers.import_csv(path) for path in paths]
+    final_size = importers.frame_extent(frames[-1])
+    images = [plotters.render_indexed(frame, final_size, placement) for frame in frames]
+
+    def import_stage():
+        for path in paths:
+            importers.import_csv(path)
+
+    packpath = framepack.convert_simulation(simpath, os.path.join(outDir, framepack.PACK_NAME))
+
+    def pack_import_stage():
+        with framepack.FramePack(packpath) as pack:
+            for frame in pack:
+                pass
+
+    def render_stage():
+        for frame in frames:
+            plotters.render_indexed(frame, final_size, placement)
+
+    def canvas_stage():
+        canvas = plotters.FrameCanvas(final_size, placement)
+        for frame in frames:
+            canvas.render(frame)
+
+    def png_stage():
+        warm = rendercache.CACHE
+        rendercache.use_cache(memory_mb = 0)  # Every frame is encoded
+        for k, image in enumerate(images):
+            exporters.write_png(os.path.join(outDir, 'img_%04d.png' % k), image)
+        rendercache.CACHE = warm  # Put back as it was, so png_cached isn't timed on an empty cache
+
+    def png_cached_stage():
+        for k, image in enumerate(images):
+            exporters.write_png(os.path.join(outDir, 'img_%04d.png' % k), image)
+
+    rendercache.use_cache()
+    png_cached_stage()  # Warms the cache up front, so even the first timed run of png_cached only hits it
+
+    def gif_stage():
+        exporters.write_gif(os.path.join(outDir, 'Animation.gif'), images)
+
+    def space_time_stage():
+        STPlotter.stPlotFromFrames(frames, final_size, [('row', None), ('col', None)], placement, len(frames))
+
+    stages = [('import', import_stage), ('pack_import', pack_import_stage), ('render', render_stage), ('canvas', canvas_stage), ('png', png_stage),
+              ('png_cached', png_cached_stage), ('gif', gif_stage), ('space_time', space_time_stage)]
+    return stages, frames, final_size
+
+
+def import_time(module, repeats = 3):
+    """
+    This function times importing a module of tools in a fresh Python process (the best of repeats runs).
+    Returns {'seconds': ..., 'pyplot': whether matplotlib.pyplot got imported along with it}.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT % module], cwd = here, capture_output = True, text = True, check = True)
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        if (best is None) or (result['seconds'] < best['seconds']):
+            best = result
+    return best
+
+
+def run_startup(repeats = 3):
+    """This function times importing every module in STARTUP_MODULES from scratch, see import_time"""
+    return {module: import_time(module, repeats) for module in STARTUP_MODULES}
+
+
+def run_suite(final_size = (100, 400), n_frames = 100, repeats = 3, seed = 0):
+    """
+    This function makes a synthetic simulation and times each stage of the pipeline on it.
+    Returns the results as a dictionary (see --save), with the best time, frames per second, MB of cells per second and peak memory of each stage.
+    """
+    results = {'final_size': list(final_size), 'n_frames': n_frames, 'python': platform.python_version(),
+               'numpy': np.__version__, 'machine': platform.machine(), 'stages': {}}
+    with tempfile.TemporaryDirectory() as workDir:
+        simpath = os.path.join(workDir, 'sim')
+        outDir = os.path.join(workDir, 'out')
+        os.makedirs(outDir)
+        synthetic.make_simulation(simpath, final_size, n_frames, seed = seed)
+        stages, frames, final_size = pipeline_stages(simpath, outDir)
+        n_cells = sum(int(np.asarray(frame).size) for frame in frames)
+        for name, stage in stages:
+            seconds = time_call(stage, repeats = repeats)
+            results['stages'][name] = {'seconds': seconds, 'frames_per_s': n_frames / seconds,
+                                       'mcells_per_s': n_cells / seconds / 1e6, 'peak_mb': peak_memory(stage) / 1e6}
+    return results
+
+
+def print_results(results, baseline = None):
+    """This function prints a table of suite results, and how much faster each stage is than a baseline run if one is given"""
+    if 'startup' in results:
+        print("Import time of tools modules in a fresh process")
+        for name, startup in results['startup'].items():
+            line = "  %-12s %8.4f s%s" % (name, startup['seconds'], '   (imports matplotlib.pyplot)' if startup['pyplot'] else '')
+            if (baseline is not None) and (name in baseline.get('startup', {})):
+                line += "   %5.2fx vs baseline" % (baseline['startup'][name]['seconds'] / startup['seconds'])
+            print(line)
+    print("Pipeline on %d frames up to %d x %d" % ((results['n_frames'],) + tuple(results['final_size'])))
+    for name, stage in results['stages'].items():
+        line = "  %-12s %8.4f s %9.1f frames/s %8.2f Mcells/s %8.2f MB peak" % (
+            name, stage['seconds'], stage['frames_per_s'], stage['mcells_per_s'], stage['peak_mb'])
+        if (baseline is not None) and (name in baseline['stages']):
+            line += "   %5.2fx vs baseline" % (baseline['stages'][name]['seconds'] / stage['seconds'])
+        print(line)
+
+
+def parse_args(argv = None):
+    """This function reads the command line options"""
+    parser = argparse.ArgumentParser(description = "Benchmark the zebrafish_plot pipeline on synthetic simulations.")
+    parser.add_argument('--rows', type = int, default = 100, help = "rows of the final frame (default: %(default)s)")
+    parser.add_argument('--cols', type = int, default = 400, help = "columns of the final frame (default: %(default)s)")
+    parser.add_argument('--frames', type = int, default = 100, help = "number of frames (default: %(default)s)")
+    parser.add_argument('--repeats', type = int, default = 3, help = "times each stage is run, the best is kept (default: %(default)s)")
+    parser.add_argument('--save', metavar = 'JSON', help = "save the results to this file")
+    parser.add_argument('--compare', metavar = 'JSON', help = "compare against results saved earlier with --save")
+    parser.add_argument('--micro', action = 'store_true', help = "also run the old-loop and matplotlib comparisons")
+    parser.add_argument('--no-startup', action = 'store_true', help = "skip timing the imports of the tools modules")
+    return parser.parse_args(argv)
+
+
+def main(argv = None):
+    args = parse_args(argv)
+    if args.micro:
+        bench_render()
+        bench_png()
+
+    results = run_suite((args.rows, args.cols), args.frames, args.repeats)
+    if not args.no_startup:
+        results['startup'] = run_startup(args.repeats)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent = 1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,7 +5,8 @@ or from a bunch of 2D arrays directly (add data one at a time). It will also con
 
 import numpy as np
 import math
-import matplotlib.pyplot as plt
+
+from . import plotters, exporters, schema
 
 
 def stPlotFrom3Dmat(array3D, rowChoice = None, colChoice = None):
@@ -34,7 +35,7 @@ def stPlotFrom3Dmat(array3D, rowChoice = None, colChoice = None):
 
 def stPlotEmptyTemplate(rdim, cdim):
     """Creates a blank (filled with 10s for coloring) array to fill in STplot Data"""
-    return 10 * np.ones((rdim, cdim))
+    return schema.EMPTY_CODE * np.ones((rdim, cdim))
 
 
 def fillSlice(cut, desired_size = None):
@@ -42,11 +43,11 @@ def fillSlice(cut, desired_size = None):
     if not desired_size:
         return cut
     elif len(cut) == 1:
-        out = 10 * np.ones(desired_size)
+        out = schema.EMPTY_CODE * np.ones(desired_size)
         out[0] = cut
         return out
     elif len(cut) <= desired_size:
-        out = 10 * np.ones(desired_size)
+        out = schema.EMPTY_CODE * np.ones(desired_size)
         out[0:len(cut)] = cut
         return out
     else:
@@ -63,16 +64,152 @@ def plotST(STarray):
     Black indicates melanophores (M in model)
     Blue indicates empty space, that isn't any sort of cell.
     """
+    return plotters.PALETTE[plotters.color_codes(STarray)]
 
-    outArray = np.zeros((STarray.shape[0], STarray.shape[1], 3))
-    outArray[:,:,2] = np.ones((STarray.shape[0], STarray.shape[1]))  # defaults all values to blue ([0, 0, 1])
-    outArray[STarray == 0, :] = [1, 1, 1]  # White for dead/empty cells
-    outArray[STarray == 1, :] = [1, 1, 0]  # Yellow for xanthophores
-    outArray[STarray == 2, :] = [0, 0, 0]  # Black for melanophores
 
-    return outArray
+def parse_cut(cut):
+    """
+    This function reads a cut written as 'row', 'col', 'row:<index>' or 'col:<index>' into a (direction, index) tuple.
+    No index means the middle row (or column) of the final image.
+    """
+    direction, _, index = str(cut).partition(':')
+    direction = direction.strip().lower()
+    if direction not in ('row', 'col'):
+        print("Error: cuts must be along a 'row' or a 'col', not " + str(cut))
+        return
+    if index.strip() == '':
+        return (direction, None)
+    try:
+        return (direction, int(index))
+    except ValueError:
+        print("Error: the index of a cut must be a whole number, not " + index)
+        return
 
 
-        
+def cut_name(cut):
+    """This function names a (direction, index) cut for file names, like 'row_12'"""
+    return '%s_%d' % cut
 
 
+def resolve_cut(cut, final_size):
+    """
+    This function gives the (direction, index) a cut ends up at in an image of final_size, with no index meaning the middle row (or column).
+    Returns None if the cut is outside of the image.
+    """
+    direction, index = cut
+    if index is None:
+        index = (final_size[0] - 1) // 2 if direction == 'row' else (final_size[1] - 1) // 2
+    if not (0 <= index < (final_size[0] if direction == 'row' else final_size[1])):
+        return
+    return (direction, int(index))
+
+
+class SpaceTimeBuilder:
+    """
+    This class builds space-time plots one frame at a time, so they can be made in the same pass over the frames as the images and animations.
+
+    Cuts are (direction, index) tuples (see parse_cut) taken along a row or column of the final image, after each frame has been placed
+    the same way the frame plotters place it (see plotters.placement_offset). So a row cut of a domain growing to the right follows the same
+    cells the images show. Any number of cuts are filled in at once, each one only touches the single line of cells it needs from every frame.
+    If n_frames is known, every plot is preallocated, otherwise columns are collected as they come. Either way the memory is just
+    (length of the cut) x (number of frames) for each cut.
+    """
+
+    def __init__(self, final_size, cuts = (('row', None),), placement = 'grow_right', n_frames = None):
+        self.final_size = tuple(final_size)
+        self.placement = placement
+        self.n_frames = n_frames
+        self.cuts = []
+        for cut in cuts:
+            resolved = resolve_cut(cut, self.final_size)
+            if resolved is None:
+                print("Error: %s cut %d is outside of the final image size" % (cut[0], cut[1]))
+                continue
+            if resolved not in self.cuts:
+                self.cuts.append(resolved)
+        self.t = 0
+        self.columns = [[] for _ in self.cuts]
+        self.plots = None
+        if n_frames is not None:
+            self.plots = [np.full((self.cut_length(cut), n_frames), schema.EMPTY_CODE, dtype=np.int8) for cut in self.cuts]
+
+    def cut_length(self, cut):
+        """This function gives the number of cells along a cut (the space axis of its plot)"""
+        return self.final_size[1] if cut[0] == 'row' else self.final_size[0]
+
+    def add(self, sim_array):
+        """This function adds the next frame (0D, 1D or 2D) as the next time column of every plot"""
+        sim_array = np.asarray(sim_array)
+        offset = plotters.placement_offset(sim_array.shape, self.final_size, self.placement)
+        if offset is None:
+            return
+        row_shift, col_shift = offset
+        block = plotters.as_2D(sim_array)
+        if block.dtype.kind == 'f':
+            block = np.where(np.isfinite(block), block, schema.EMPTY_CODE)
+
+        for k, (direction, index) in enumerate(self.cuts):
+            if self.plots is not None:
+                column = self.plots[k][:, self.t]
+            else:
+                column = np.full(self.cut_length((direction, index)), schema.EMPTY_CODE, dtype=np.int8)
+            if direction == 'row':
+                line, start = index - row_shift, col_shift
+                if 0 <= line < block.shape[0]:
+                    values = block[line, :]
+                    column[start:start + len(values)] = values[:len(column) - start]
+            else:
+                line, start = index - col_shift, row_shift
+                if 0 <= line < block.shape[1]:
+                    values = block[:, line]
+                    column[start:start + len(values)] = values[:len(column) - start]
+            if self.plots is None:
+                self.columns[k].append(column)
+        self.t += 1
+
+    def resume(self, plots):
+        """This function starts the plots off from plots of the first frames made earlier (as returned by result()), so only the frames after them are added"""
+        for k, plot in enumerate(plots):
+            if self.plots is not None:
+                self.plots[k][:, :plot.shape[1]] = plot
+            else:
+                self.columns[k] = list(plot.T)
+        self.t = plots[0].shape[1] if len(plots) > 0 else 0
+
+    def result(self):
+        """This function returns the finished space-time plots, one 2D (space, time) array per cut, in the order of the cuts"""
+        if self.plots is not None:
+            return [plot[:, :self.t] for plot in self.plots]
+        return [np.stack(columns, axis=1) if columns else np.zeros((self.cut_length(cut), 0), dtype=np.int8)
+                for cut, columns in zip(self.cuts, self.columns)]
+
+
+def stPlotFromFrames(frames, final_size, cuts = (('row', None),), placement = 'grow_right', n_frames = None):
+    """
+    This function builds space-time plots in one pass over any sequence of frames (a list, a generator reading them from disk,
+    or the frames of a frame stack from importers.stack_frame). See SpaceTimeBuilder for how cuts are placed.
+    Returns one 2D (space, time) array per cut.
+    """
+    builder = SpaceTimeBuilder(final_size, cuts, placement, n_frames)
+    for frame in frames:
+        builder.add(frame)
+    return builder.result()
+
+
+def saveST(filepath, STarray, styled = False):
+    """
+    This function saves a space-time plot as a .png, with one pixel per cell and time point.
+    With styled, it is saved as a matplotlib figure instead, with the Space and Time axes labelled.
+    """
+    if styled:
+        import matplotlib.pyplot as plt  # Only imported when it's needed, it's slow to import
+        plt.figure()
+        plt.axes(frameon=False)
+        ax = plt.subplot(111)
+        ax.set_ylabel('Space')
+        ax.set_xlabel('Time')
+        ax.imshow(plotST(STarray))
+        plt.savefig(filepath, bbox_inches='tight')
+        plt.close()
+    else:
+        exporters.write_png(filepath, plotters.color_codes(STarray))
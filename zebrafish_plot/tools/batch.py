@@ -0,0 +1,585 @@
+"""
+This module holds the functions that turn whole simulations into images and animations, spread out over a pool of processes.
+Work is split both by simulation and by chunks of frames within a simulation, so one big run can use every core just like a day of small runs.
+Workers write their images straight to disk and only hand small things (frame names, sizes, manifest entries) back to the main process.
+"""
+
+import os
+import glob
+import json
+import fnmatch
+import hashlib
+import numpy as np
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from . import importers, plotters, exporters, STPlotter, profiling, stats, rendercache
+
+
+IMAGE_DIR = 'Images'  # Made inside each simulation folder to hold the outputs
+MANIFEST_NAME = 'manifest.json'  # Kept in IMAGE_DIR, records what has been rendered so re-runs only do new or changed frames
+ANIMATION_NAME = 'Animation'  # The extension comes from the 'animation' setting
+FINISH_STATE_NAME = 'finish_state.npz'  # Kept in IMAGE_DIR, the space-time plots so far and the frames they cover, so the next run only adds the new frames
+
+DEFAULT_SETTINGS = {
+    'placement': 'grow_right',  # See plotters.PLACEMENTS
+    'scale': 1,  # Each cell becomes a scale x scale block of pixels in the .png files
+    'styled': False,  # Save frames through matplotlib figures instead of writing the pixels directly
+    'fps': 50,  # Frame rate of the animation
+    'animation': 'gif',  # Animation format, 'gif' or a video container like 'mp4' (needs imageio-ffmpeg)
+    'stride': 1,  # Only every stride-th frame goes into the animation
+    'max_duration': None,  # If set, the stride is raised so the animation lasts at most this many seconds
+    'delta': True,  # Store only the pixels that changed since the frame before in .gif animations (see exporters.GifWriter)
+    'space_time': [],  # Cuts to make space-time plots along, like 'row', 'row:40' or 'col:12' (see STPlotter.parse_cut)
+    'max_size': None,  # If set, (rows, cols) the frames are shrunk to fit inside before they're saved (see plotters.render_downsampled)
+    'downsample': 'mode',  # How frames are shrunk to max_size, 'mode' (most common cell type) or 'stride' (pick one cell)
+    'stats': False,  # Also save a table of pattern statistics of every frame (see stats.PatternStats)
+    'stats_cuts': ['col'],  # Cuts of each frame the stripes are counted along, like 'col' or 'row:12'
+    'min_stripe_width': 1,  # Shorter runs of cells aren't counted as stripes
+    'cell_types': None,  # Cell-state schema config (codes, names, colors), None for the built-in S/X/M one (see schema.py)
+    'canvas_size': None,  # If set, (rows, cols) of the images instead of the size of the last frame, so a simulation that's still growing keeps the same canvas
+    'preview_frames': None,  # If set, the animation only shows the last this many frames (a rolling preview of a running simulation)
+    'render_cache': None,  # If set, a folder shared by every worker and run that keeps encoded frames, so identical frames are only encoded once (see rendercache.py)
+    'render_cache_mb': rendercache.DISK_MB,  # The least recently used files of render_cache are deleted past this size
+    'frame_cache': True,  # Keep a .npy copy of every decoded .csv in the simulation folder, so it's only parsed once (see importers.load_frame)
+}
+FRAME_SETTINGS = ('placement', 'scale', 'styled', 'max_size', 'downsample', 'cell_types', 'final_size')  # The settings each frame's .png depends on, the rest only change the animation
+CACHE_SETTINGS = ('render_cache', 'render_cache_mb', 'frame_cache')  # Settings that don't change any output, so they aren't kept in the manifest
+SPACE_TIME_SETTINGS = ('placement', 'space_time', 'cell_types')  # The settings the space-time plots depend on (with the final size)
+STATS_SETTINGS = ('stats_cuts', 'min_stripe_width', 'cell_types')  # The settings the table of pattern statistics depends on
+
+
+def find_simulations(paths):
+    """
+    This function turns a list of folders (or glob patterns) into the list of simulation folders to process.
+    A folder holding img*.csv files (or a frame pack) is a simulation itself, any other folder (like a day of runs) is searched one level down for simulations.
+    """
+    sims = []
+    for pattern in paths:
+        for path in sorted(glob.glob(os.path.expanduser(pattern))):
+            if not os.path.isdir(path):
+                continue
+            if len(importers.simulation_frames(path)) > 0:
+                sims.append(path)
+            else:
+                for item in sorted(os.listdir(path)):
+                    subpath = os.path.join(path, item)
+                    if os.path.isdir(subpath) and len(importers.simulation_frames(subpath)) > 0:
+                        sims.append(subpath)
+
+    unique = []
+    for sim in sims:
+        sim = os.path.join(os.path.abspath(sim), '')  # Always ends in a slash, like the paths in the scripts
+        if sim not in unique:
+            unique.append(sim)
+    return unique
+
+
+def file_hash(filepath):
+    """This function returns the sha1 of a file's contents"""
+    digest = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def frame_stat(sim, name):
+    """
+    This function gives a cheap check of whether the source of a frame changed: the size and modification time of its .csv,
+    or for a frame read from a frame pack, the size and crc32 of its block (which already depend on the contents).
+    """
+    pack = importers.open_pack(sim)
+    if (pack is not None) and (name in pack.positions):
+        entry = pack.entry(name)
+        return {'size': entry['length'], 'crc32': entry['crc32']}
+    stat = os.stat(os.path.join(sim, name))
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def cells_hash(frame):
+    """This function gives the sha1 of a decoded frame's cells (with its shape and type), which is the same whether it was read from a .csv or a frame pack"""
+    frame = np.ascontiguousarray(frame)
+    digest = hashlib.sha1((frame.dtype.str + str(frame.shape)).encode())
+    digest.update(frame.tobytes())
+    return digest.hexdigest()
+
+
+def frame_record(sim, name):
+    """This function gives the manifest entry of a frame's source: its frame_stat, plus the hash of the .csv for frames read from .csv files"""
+    record = frame_stat(sim, name)
+    if 'mtime_ns' in record:
+        record['sha1'] = file_hash(os.path.join(sim, name))
+    return record
+
+
+def load_manifest(sim):
+    """This function reads the manifest of a simulation's outputs (see save_manifest), or returns None if there isn't one"""
+    manifest_path = os.path.join(sim, IMAGE_DIR, MANIFEST_NAME)
+    if not os.path.isfile(manifest_path):
+        return
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except ValueError:
+        print("Error: unreadable manifest " + manifest_path + ", rendering everything again")
+        return
+
+
+def save_manifest(sim, manifest):
+    """
+    This function saves the manifest of a simulation next to its images.
+    It holds the render settings (with the final image size) and a frame_record for every frame that has been rendered, with the cells_hash of what was drawn.
+    """
+    manifest_path = os.path.join(sim, IMAGE_DIR, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent = 1, sort_keys = True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+
+def render_settings(settings, final_size):
+    """This function gives the settings that the images depend on, in the form they're stored in the manifest"""
+    settings = {key: value for key, value in settings.items() if key not in CACHE_SETTINGS}
+    return json.loads(json.dumps(dict(settings, final_size = list(final_size))))
+
+
+def plan_simulation(sim, settings = DEFAULT_SETTINGS, force = False, settle = None):
+    """
+    This function works out what needs to be done for a simulation: it lists the frames, finds the size of the canvas they're all drawn into
+    (the size of the last frame, or the canvas_size setting), and compares every frame against the manifest of the last run to find the ones that are new or changed.
+    If settle is given, frames that may still be being written are left for later (see importers.settled_frames).
+    A .csv is only hashed if its size or modification time changed, so checking an up to date simulation is cheap.
+    If the settings that go into the images or the final size changed (or force is set), every frame is stale.
+    Returns (img_list, final_size, stale frame names, manifest, whether any setting changed).
+    """
+    with profiling.stage('plan', sim = sim) as timer:
+        img_list = importers.simulation_frames(sim)
+        if settle is not None:
+            img_list = importers.settled_frames(sim, img_list, settle)
+        if len(img_list) == 0:
+            return img_list, None, [], None, False
+        if settings['canvas_size'] is not None:
+            final_size = tuple(settings['canvas_size'])
+        else:
+            final_size = importers.frame_extent(importers.read_frame(sim, img_list[-1], settings['frame_cache']))
+        timer.add(frames = len(img_list))
+
+    manifest = load_manifest(sim)
+    current = render_settings(settings, final_size)
+    previous = {} if manifest is None else manifest.get('settings', {})
+    changed = (previous != current)
+    if force or (manifest is None) or any(previous.get(key) != current[key] for key in FRAME_SETTINGS):
+        if (not force) and (manifest is not None) and (len(manifest['frames']) > 0) and ('final_size' in previous) and all(
+                previous.get(key) == current[key] for key in FRAME_SETTINGS if key != 'final_size'):
+            print("The canvas of %s changed from %dx%d to %dx%d, rendering every frame again (a fixed canvas size, --canvas, avoids this)"
+                  % ((sim,) + tuple(previous['final_size']) + tuple(final_size)))
+        manifest = {'frames': {}}
+    manifest['settings'] = current
+
+    records = {}
+    stale = []
+    for name in img_list:
+        record = manifest['frames'].get(name)
+        stat = frame_stat(sim, name)
+        if (record is not None) and os.path.isfile(image_path(sim, name)):
+            if all(record.get(key) == value for key, value in stat.items()):
+                records[name] = record
+                continue
+            elif ('mtime_ns' in stat) and (record.get('size') == stat['size']) and (record.get('sha1') == file_hash(os.path.join(sim, name))):  # Touched but not changed
+                records[name] = dict(record, mtime_ns = stat['mtime_ns'])
+                continue
+            elif ('cells' in record) and (record['cells'] == cells_hash(importers.read_frame(sim, name, settings['frame_cache']))):  # Moved into (or out of) a frame pack, but the same cells
+                records[name] = dict(frame_record(sim, name), cells = record['cells'])
+                continue
+        stale.append(name)
+    manifest['frames'] = records  # Frames whose .csv is gone are dropped too
+    return img_list, final_size, stale, manifest, changed
+
+
+def image_path(sim, name):
+    """This function gives the .png a frame .csv is saved to"""
+    return os.path.join(sim, IMAGE_DIR, name.replace('.csv', '.png'))
+
+
+def render_image(sim_array, final_size, settings = DEFAULT_SETTINGS, canvas = None):
+    """
+    This function renders a frame into palette indices the way the settings ask for, shrunk to fit max_size if it's set.
+    Full size frames are drawn into canvas (a plotters.FrameCanvas) if one is given, so the returned array is reused by the next call.
+    """
+    if settings['max_size'] is None:
+        if canvas is not None:
+            return canvas.render(sim_array)
+        return plotters.render_indexed(sim_array, final_size, settings['placement'])
+    return plotters.render_downsampled(sim_array, final_size, settings['placement'], target_size = settings['max_size'], method = settings['downsample'])
+
+
+def render_frames(sim, names, final_size, settings = DEFAULT_SETTINGS):
+    """
+    This function renders a chunk of frames of one simulation and saves each one as a .png. It is what the worker processes run.
+    Only the manifest entries of the frames saved go back to the caller, the images themselves stay on disk.
+    """
+    plotters.use_schema(settings['cell_types'])  # Workers don't share the main process's schema, so every task sets it
+    rendercache.use_cache(settings['render_cache'], settings['render_cache_mb'])
+    records = {}
+    sources = {name: frame_record(sim, name) for name in names}  # Taken before reading, so a .csv that changes while we work is caught next time
+    canvas = plotters.FrameCanvas(final_size, settings['placement'])  # Each .png is written before the next frame is drawn, so one canvas does
+    for name, sim_array in importers.SimulationReader(sim, names, use_cache = settings['frame_cache']).items():
+        with profiling.stage('render', sim = sim, frame = name, frames = 1):
+            image = render_image(sim_array, final_size, settings, canvas)
+        if image is None:
+            print("Error: could not render " + os.path.join(sim, name))
+            continue
+        with profiling.stage('png', sim = sim, frame = name, frames = 1) as timer:
+            if settings['styled']:
+                exporters.write_styled_png(image_path(sim, name), image)
+            else:
+                exporters.write_png(image_path(sim, name), image, scale = settings['scale'])
+            if timer.enabled:
+                timer.add(bytes_written = os.path.getsize(image_path(sim, name)))
+        records[name] = dict(sources[name], cells = cells_hash(sim_array))  # The cells that were drawn, so a frame that only moved into a frame pack isn't drawn again
+    return records
+
+
+def animation_path(sim, settings = DEFAULT_SETTINGS):
+    """This function gives the file the animation of a simulation is saved to"""
+    return os.path.join(sim, IMAGE_DIR, ANIMATION_NAME + '.' + settings['animation'])
+
+
+def finish_simulation(sim, img_list, final_size, settings = DEFAULT_SETTINGS, records = None):
+    """
+    This function makes the outputs that need every frame of a simulation (the animation and space-time plots), once all of its frames are rendered.
+    Frames are streamed one at a time out of the frame cache, in a single pass that feeds the animation writer, the space-time plots
+    and the pattern statistics, so no .csv is parsed a second time and memory doesn't grow with the size of the domain.
+    If records (the manifest entries of the frames) are given, the space-time plots and statistics carry on from the last run that made them
+    when none of the frames they cover changed (see resume_finish_state), so a simulation that's still running only has its new frames read.
+    """
+    plotters.use_schema(settings['cell_types'])
+    rendercache.use_cache(settings['render_cache'], settings['render_cache_mb'])
+    max_frames = None
+    if settings['max_duration'] is not None:
+        max_frames = int(settings['max_duration'] * settings['fps'])
+    previewed = img_list if settings['preview_frames'] is None else img_list[-settings['preview_frames']:]
+    animated = set(exporters.decimate(previewed, settings['stride'], max_frames))
+
+    cuts = [STPlotter.parse_cut(cut) for cut in settings['space_time']]
+    space_time = None
+    if len(cuts) > 0:
+        space_time = STPlotter.SpaceTimeBuilder(final_size, [cut for cut in cuts if cut is not None], settings['placement'], len(img_list))
+    pattern_stats = None
+    if settings['stats']:
+        cuts = [STPlotter.parse_cut(cut) for cut in settings['stats_cuts']]
+        pattern_stats = stats.PatternStats([cut for cut in cuts if cut is not None], settings['min_stripe_width'])
+
+    all_frames = img_list
+    state = None
+    space_time_from, stats_from = len(all_frames), len(all_frames)  # Where the frames each of them still needs start
+    if (space_time is not None) or (pattern_stats is not None):
+        state = load_finish_state(sim)
+        space_time_from, stats_from = resume_finish_state(sim, img_list, final_size, records or {}, space_time, pattern_stats, settings, state)
+        start = min(space_time_from, stats_from)
+        img_list = [name for k, name in enumerate(img_list) if (k >= start) or (name in animated)]  # Only new frames are added to the plots and statistics
+    else:  # Only the animation needs reading
+        img_list = [name for name in img_list if name in animated]
+    space_time_added, stats_added = set(all_frames[space_time_from:]), set(all_frames[stats_from:])
+    canvas = plotters.FrameCanvas(final_size, settings['placement'], track_changes = settings['delta'])
+    temp_path = os.path.join(sim, IMAGE_DIR, '.' + os.path.basename(animation_path(sim, settings)))  # Moved into place when done, so viewers never see half of it
+    with exporters.open_animation(temp_path, fps = settings['fps'], delta = settings['delta']) as writer:
+        for name, sim_array in importers.SimulationReader(sim, img_list, use_cache = settings['frame_cache']).items():
+            if (space_time is not None) and (name in space_time_added):
+                with profiling.stage('space_time', sim = sim, frame = name, frames = 1):
+                    space_time.add(sim_array)
+            if (pattern_stats is not None) and (name in stats_added):
+                with profiling.stage('stats', sim = sim, frame = name, frames = 1):
+                    pattern_stats.add(name, sim_array)
+            if name in animated:
+                with profiling.stage('animation', sim = sim, frame = name, frames = 1):
+                    image = render_image(sim_array, final_size, settings, canvas)
+                    if image is not None:
+                        writer.append(image, canvas.changed_box if image is canvas.index else None)  # Shrunk frames don't go through the canvas
+    if os.path.isfile(temp_path):
+        os.replace(temp_path, animation_path(sim, settings))
+    with profiling.stage('animation', sim = sim) as timer:  # Just to count the bytes of the finished file
+        if timer.enabled and os.path.isfile(animation_path(sim, settings)):  # No frame may have reached the writer
+            timer.add(bytes_written = os.path.getsize(animation_path(sim, settings)))
+
+    if pattern_stats is not None:
+        with profiling.stage('stats', sim = sim) as timer:
+            pattern_stats.save(stats_path(sim))
+            if timer.enabled:
+                timer.add(bytes_written = os.path.getsize(stats_path(sim)))
+    if space_time is not None:
+        for cut, STarray in zip(space_time.cuts, space_time.result()):
+            with profiling.stage('space_time', sim = sim) as timer:
+                STPlotter.saveST(space_time_path(sim, cut), STarray, styled = settings['styled'])
+                if timer.enabled:
+                    timer.add(bytes_written = os.path.getsize(space_time_path(sim, cut)))
+    if (space_time is not None) or (pattern_stats is not None):
+        cells = [(records or {}).get(name, {}).get('cells', '') for name in all_frames]
+        if pattern_stats is not None:
+            stats_state = (stats_key(settings), cells)
+        elif state is not None:  # The table an earlier run left is kept, so the next run with stats can carry on from it
+            stats_state = (state['stats_key'], state['stats_cells'])
+        else:
+            stats_state = ('', [])
+        save_finish_state(sim, finish_key(final_size, settings), all_frames, cells, [] if space_time is None else space_time.result(), *stats_state)
+    return sim
+
+
+def space_time_path(sim, cut):
+    """This function gives the .png a space-time plot along a (direction, index) cut is saved to"""
+    return os.path.join(sim, IMAGE_DIR, 'SpaceTimePlot_' + STPlotter.cut_name(cut) + '.png')
+
+
+def stats_path(sim):
+    """This function gives the file the table of pattern statistics of a simulation is saved to"""
+    return os.path.join(sim, IMAGE_DIR, stats.STATS_NAME)
+
+
+def finish_state_path(sim):
+    """This function gives the file the state of the space-time plots and statistics of a simulation is kept in (see save_finish_state)"""
+    return os.path.join(sim, IMAGE_DIR, FINISH_STATE_NAME)
+
+
+def finish_key(final_size, settings = DEFAULT_SETTINGS):
+    """This function gives the settings the space-time plots depend on as a string, so saved plots are only used with the same ones"""
+    return json.dumps(dict({key: settings[key] for key in SPACE_TIME_SETTINGS}, final_size = list(final_size)), sort_keys = True)
+
+
+def stats_key(settings = DEFAULT_SETTINGS):
+    """This function gives the settings the table of pattern statistics depends on as a string, so a saved table is only carried on with the same ones"""
+    return json.dumps({key: settings[key] for key in STATS_SETTINGS}, sort_keys = True)
+
+
+def save_finish_state(sim, key, frames, cells, plots, stats_key = '', stats_cells = ()):
+    """
+    This function saves what finish_simulation needs to carry on next run without reading every frame again: the frames the space-time plots cover
+    with the cells_hash of each, the plots themselves (as cell codes, the .png files only have colors) and the finish_key they were made with.
+    The statistics are read back from their table, so for them only the stats_key they were made with and the cells_hash of the frames they cover are kept.
+    """
+    filepath = finish_state_path(sim)
+    with open(filepath + '.tmp', 'wb') as f:
+        np.savez(f, key = np.array(key), frames = np.array(frames, dtype=str), cells = np.array(cells, dtype=str),
+                 stats_key = np.array(stats_key), stats_cells = np.array(stats_cells, dtype=str),
+                 **{'plot_%d' % k: plot for k, plot in enumerate(plots)})
+    os.replace(filepath + '.tmp', filepath)
+
+
+def load_finish_state(sim):
+    """This function reads the state saved by save_finish_state back as a dictionary of its arguments, or returns None if there isn't one"""
+    filepath = finish_state_path(sim)
+    if not os.path.isfile(filepath):
+        return
+    try:
+        with np.load(filepath) as data:
+            n_plots = len([name for name in data.files if name.startswith('plot_')])
+            return {'key': str(data['key']), 'frames': [str(name) for name in data['frames']], 'cells': [str(cell) for cell in data['cells']],
+                    'plots': [data['plot_%d' % k] for k in range(n_plots)],
+                    'stats_key': str(data['stats_key']), 'stats_cells': [str(cell) for cell in data['stats_cells']]}
+    except (ValueError, OSError, KeyError):  # Half written, corrupted or from an older version, everything is just read again
+        return
+
+
+def resume_finish_state(sim, img_list, final_size, records, space_time = None, pattern_stats = None, settings = DEFAULT_SETTINGS, state = None):
+    """
+    This function starts space_time (a STPlotter.SpaceTimeBuilder) and pattern_stats (a stats.PatternStats) off from the state an earlier run saved
+    (see load_finish_state), each one only if what it was made from is the first frames of img_list, and every one of them still has the same
+    cells_hash in records (the manifest entries). Returns how many frames each of them starts with, (space-time, statistics).
+    """
+    def unchanged(frames, cells):
+        return ((len(frames) == len(cells)) and (frames == img_list[:len(frames)])
+                and all(records.get(name, {}).get('cells', '') == cell != '' for name, cell in zip(frames, cells)))
+
+    space_time_from, stats_from = len(img_list), len(img_list)
+    if space_time is not None:
+        space_time_from = 0
+        if ((state is not None) and (state['key'] == finish_key(final_size, settings)) and unchanged(state['frames'], state['cells'])
+                and (len(state['plots']) == len(space_time.cuts))
+                and all(plot.shape == (space_time.cut_length(cut), len(state['frames'])) for cut, plot in zip(space_time.cuts, state['plots']))):
+            space_time.resume(state['plots'])
+            space_time_from = len(state['frames'])
+    if pattern_stats is not None:
+        stats_from = 0
+        if (state is not None) and (state['stats_key'] == stats_key(settings)) and os.path.isfile(stats_path(sim)):
+            try:
+                table = stats.load_stats(stats_path(sim))
+            except (ValueError, OSError):
+                table = None
+            if (table is not None) and unchanged([str(name) for name in table['frame']], state['stats_cells']):
+                pattern_stats.resume(table)
+                stats_from = len(table['frame'])
+    return space_time_from, stats_from
+
+
+def saved_space_time(sim, cut, final_size, placement = 'grow_right'):
+    """
+    This function gives the space-time plot along a (direction, index) cut kept by the last run's finish_simulation (see save_finish_state),
+    so it doesn't have to be built from every frame again. Returns None unless that run covered every frame of the simulation there is now
+    and used the same final_size and placement.
+    """
+    filepath = finish_state_path(sim)
+    if not os.path.isfile(filepath):
+        return
+    try:
+        with np.load(filepath) as data:
+            key = json.loads(str(data['key']))
+            if ((key['placement'] != placement) or (tuple(key['final_size']) != tuple(final_size))
+                    or ([str(name) for name in data['frames']] != importers.simulation_frames(sim))):
+                return
+            cuts = space_time_cuts(final_size, key)
+            target = STPlotter.resolve_cut(cut, final_size)
+            if target in cuts:
+                return data['plot_%d' % cuts.index(target)]
+    except (ValueError, OSError, KeyError):
+        return
+
+
+def space_time_cuts(final_size, settings = DEFAULT_SETTINGS):
+    """This function gives the (direction, index) cuts the space-time plots asked for in the settings end up at (see STPlotter.resolve_cut)"""
+    cuts = [STPlotter.parse_cut(cut) for cut in settings['space_time']]
+    cuts = [STPlotter.resolve_cut(cut, final_size) for cut in cuts if cut is not None]
+    unique = []
+    for cut in cuts:
+        if (cut is not None) and (cut not in unique):  # In the same order as SpaceTimeBuilder.cuts
+            unique.append(cut)
+    return unique
+
+
+def stats_frames(sim):
+    """This function gives the frames the table of pattern statistics of a simulation covers, or None if there's no readable table"""
+    if not os.path.isfile(stats_path(sim)):
+        return
+    try:
+        with np.load(stats_path(sim)) as data:
+            return [str(name) for name in data['frame']]
+    except (ValueError, OSError, KeyError):
+        return
+
+
+def needs_finishing(sim, img_list, stale, changed, final_size, settings = DEFAULT_SETTINGS):
+    """This function checks whether the whole-simulation outputs have to be made again"""
+    if settings['stats'] and (stats_frames(sim) != img_list):  # Missing, or left by a run that didn't have every frame
+        return True
+    if any(not os.path.isfile(space_time_path(sim, cut)) for cut in space_time_cuts(final_size, settings)):
+        return True
+    return (len(stale) > 0) or changed or not os.path.isfile(animation_path(sim, settings))
+
+
+class InlinePool:
+    """This class stands in for the process pool when there is only one worker, running every task right away in this process"""
+
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as err:
+            future.set_exception(err)
+        return future
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+def profile_path(sim, tag, profile_sims = (), profile_dir = None):
+    """
+    This function gives the file the cProfile dump of one task of a simulation goes to, if the simulation matches one of the
+    profile_sims patterns (matched against its folder name or full path). Returns None for simulations that aren't profiled.
+    """
+    if profile_dir is None:
+        return
+    name = os.path.basename(os.path.normpath(sim))
+    for pattern in profile_sims:
+        if fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(os.path.normpath(sim), pattern):
+            return os.path.join(profile_dir, '%s_%s.prof' % (name, tag))
+
+
+def run_batch(sims, workers = None, frames_per_task = 50, settings = DEFAULT_SETTINGS, force = False,
+              recorder = None, profile_sims = (), profile_dir = None, settle = None):
+    """
+    This function processes every simulation in sims with a pool of workers processes (workers = None uses every core, 1 runs everything in this process).
+    Each simulation is split into tasks of frames_per_task frames, so big simulations are spread over many workers.
+    Only frames that are new or changed since the last run are rendered (see plan_simulation), unless force is set.
+    A table of pattern statistics left by an earlier run is kept when the stats setting is off, and the next run with it carries on from it.
+    Simulations are reported in the order given, whatever order the work finishes in.
+    With settle set, frames that may still be being written are left for a later run (see importers.settled_frames).
+
+    Pass a profiling.Recorder as recorder to collect the timings of every stage from every worker.
+    Simulations matching any of the profile_sims patterns are run under cProfile, with one dump per task saved in profile_dir.
+
+    An error in one simulation (like a .csv that can't be read) is reported and that simulation is left unfinished, the others carry on.
+    Frames it did render are still saved in its manifest. Frames that couldn't be rendered aren't, so they're tried again next run.
+    Returns the simulations that went through without an error and with every frame rendered.
+    """
+    if recorder is None:
+        recorder = profiling.Recorder(enabled = False)
+    errors = {}  # The first error of each simulation that failed
+
+    def submit(pool, func, args, sim, tag):
+        return pool.submit(profiling.run_task, func, args, recorder.enabled, profile_path(sim, tag, profile_sims, profile_dir))
+
+    def result(future, sim):
+        try:
+            value, records = future.result()
+        except Exception as err:
+            errors.setdefault(sim, '%s: %s' % (type(err).__name__, ' '.join(str(err).split())))  # On one line
+            return
+        recorder.extend(records)
+        return value
+
+    pool = InlinePool() if workers == 1 else ProcessPoolExecutor(max_workers = workers)
+    with pool:
+        plans = [submit(pool, plan_simulation, (sim, settings, force, settle), sim, 'plan') for sim in sims]
+        jobs = []
+        for sim, plan in zip(sims, plans):
+            plan = result(plan, sim)
+            if plan is None:
+                report_error(sim, errors[sim])
+                continue
+            img_list, final_size, stale, manifest, changed = plan
+            if len(img_list) == 0:
+                print("Waiting for the first frame of " + sim)
+                continue
+            os.makedirs(os.path.join(sim, IMAGE_DIR), exist_ok=True)
+            chunks = [stale[k:k + frames_per_task] for k in range(0, len(stale), frames_per_task)]
+            futures = [submit(pool, render_frames, (sim, chunk, final_size, settings), sim, 'frames_%04d' % k) for k, chunk in enumerate(chunks)]
+            jobs.append((sim, img_list, final_size, stale, manifest, changed, futures))
+
+        finishing = []
+        for sim, img_list, final_size, stale, manifest, changed, futures in jobs:  # Waits on simulations in order, so their frames are all done before the animation starts
+            rendered = {}
+            for future in futures:
+                rendered.update(result(future, sim) or {})
+            manifest['frames'].update(rendered)
+            save_manifest(sim, manifest)
+            failed = [name for name in stale if name not in rendered]
+            if sim in errors:
+                finishing.append((sim, img_list, rendered, failed, None))
+            elif needs_finishing(sim, img_list, stale, changed, final_size, settings):
+                finishing.append((sim, img_list, rendered, failed, submit(pool, finish_simulation, (sim, img_list, final_size, settings, manifest['frames']), sim, 'finish')))
+            else:
+                finishing.append((sim, img_list, rendered, failed, None))
+        incomplete = set()
+        for sim, img_list, rendered, failed, future in finishing:
+            if future is not None:
+                result(future, sim)
+            if sim in errors:
+                report_error(sim, errors[sim])
+            else:
+                report(sim, img_list, rendered, failed)
+            if len(failed) > 0:
+                incomplete.add(sim)
+    return [sim for sim in sims if (sim not in errors) and (sim not in incomplete)]
+
+
+def report(sim, img_list, rendered, failed = ()):
+    """This function prints how many frames of a simulation were rendered, and which ones couldn't be"""
+    print("Done " + sim + " (%d of %d frames rendered)" % (len(rendered), len(img_list)))
+    if len(failed) > 0:
+        names = ', '.join(failed[:5]) + (', ...' if len(failed) > 5 else '')
+        print("Error: %d frames of %s could not be rendered and will be tried again next run (%s)" % (len(failed), sim, names))
+
+
+def report_error(sim, error):
+    """This function prints why a simulation couldn't be finished"""
+    print("Error: could not finish " + sim + " (" + error + ")")
@@ -0,0 +1,272 @@
+"""
+This module holds the functions that write rendered frames out to image and animation files.
+Frames come in as the 1 byte per pixel palette-indexed arrays from plotters.render_indexed, and are only turned into colors here.
+"""
+
+import io
+import os
+import math
+import numpy as np
+from PIL import Image, GifImagePlugin
+
+from . import plotters, rendercache
+
+
+def palette_bytes(palette = None):
+    """This function flattens an (N, 3) uint8 palette (the schema's by default) into the byte string PIL expects for a paletted image"""
+    if palette is None:
+        palette = plotters.PALETTE_RGB8
+    return np.ascontiguousarray(palette, dtype=np.uint8).tobytes()
+
+
+def indexed_to_image(index_array, palette = None):
+    """This function wraps a palette-indexed frame into a paletted ('P' mode) PIL image without expanding it to RGB"""
+    index_array = np.ascontiguousarray(index_array, dtype=np.uint8)
+    image = Image.frombytes('P', (index_array.shape[1], index_array.shape[0]), index_array.tobytes())
+    image.putpalette(palette_bytes(palette))
+    return image
+
+
+def upscale(index_array, scale = 1):
+    """This function blows a frame up by an integer factor, turning every cell into a scale x scale block of pixels"""
+    if scale == 1:
+        return index_array
+    elif (int(scale) != scale) or (scale < 1):
+        print("Error: scale must be a positive integer")
+        return
+    return np.repeat(np.repeat(index_array, scale, axis=0), scale, axis=1)
+
+
+def write_png(filepath, index_array, scale = 1, palette = None):
+    """
+    This function saves a palette-indexed frame straight to a .png, with exactly one pixel per cell (or a scale x scale block per cell).
+    The file is a paletted png using the plotters' colors, so nothing is resampled and the colors are exact.
+    The encoded file is kept in the render cache (see rendercache.py), so a frame that's exactly like one saved before is just copied out again.
+    """
+    if not rendercache.CACHE.enabled:
+        index_array = upscale(index_array, scale)
+        if index_array is not None:
+            indexed_to_image(index_array, palette).save(filepath)
+        return
+
+    key = rendercache.frame_key('png', [index_array, np.frombuffer(palette_bytes(palette), dtype=np.uint8)], scale = scale)
+    data = rendercache.CACHE.get(key)
+    if data is None:
+        index_array = upscale(index_array, scale)
+        if index_array is None:
+            return
+        buffer = io.BytesIO()
+        indexed_to_image(index_array, palette).save(buffer, format='PNG')
+        data = rendercache.CACHE.put(key, buffer.getvalue())
+    with open(filepath, 'wb') as f:
+        f.write(data)
+
+
+def write_styled_png(filepath, index_array, palette = None):
+    """
+    This function saves a frame through a matplotlib figure with the axes and spines hidden, which is how every frame used to be saved.
+    It is much slower than write_png and resamples the image to the figure size, so only use it when you want the figure look.
+    """
+    import matplotlib.pyplot as plt  # Only imported when it's needed, it's slow to import
+    plt.figure()
+    plt.axes(frameon=False)
+    ax = plt.subplot(111)
+    ax.imshow(plotters.indexed_to_rgb(index_array, palette))
+    ax.spines['right'].set_visible(False)
+    ax.spines['left'].set_visible(False)
+    ax.spines['top'].set_visible(False)
+    ax.spines['bottom'].set_visible(False)
+    ax.get_xaxis().set_visible(False)
+    ax.get_yaxis().set_visible(False)
+    ax.tick_params(bottom="off", left='off')
+    plt.savefig(filepath, bbox_inches='tight')
+    plt.close()
+
+
+def rgb_to_indexed(rgb_array, palette = None):
+    """
+    This function turns an 8-bit RGB image back into palette indices, picking the nearest palette color for every pixel.
+    Images written by write_png come back exactly, styled figures (with their resampled edges) get snapped to the nearest color.
+    Only the distinct colors of the image are compared against the palette, so more cell types don't mean more passes over the pixels.
+    """
+    if palette is None:
+        palette = plotters.PALETTE_RGB8
+    rgb_array = np.asarray(rgb_array)[:, :, :3].astype(np.int32)
+    keys = (rgb_array[:, :, 0] << 16) | (rgb_array[:, :, 1] << 8) | rgb_array[:, :, 2]
+    colors, inverse = np.unique(keys, return_inverse=True)
+    colors = np.stack([colors >> 16, (colors >> 8) & 0xFF, colors & 0xFF], axis=1)
+    distance = ((colors[:, np.newaxis, :] - np.asarray(palette, dtype=np.int32)[np.newaxis, :, :]) ** 2).sum(axis=2)
+    return distance.argmin(axis=1).astype(np.uint8)[inverse].reshape(keys.shape)
+
+
+def decimate(frames, stride = 1, max_frames = None):
+    """
+    This function picks every stride-th frame out of a list of frames (or frame names), for cheap previews of long runs.
+    If max_frames is given, the stride is raised as much as needed so no more than max_frames are picked. The last frame is always kept.
+    """
+    if stride < 1:
+        print("Error: stride must be at least 1")
+        return
+    if (max_frames is not None) and (max_frames > 0):
+        stride = max(stride, int(math.ceil(len(frames) / max_frames)))
+    picked = list(frames[::stride])
+    if (len(frames) > 0) and ((len(frames) - 1) % stride != 0) and ((max_frames is None) or (len(picked) < max_frames)):
+        picked.append(frames[-1])
+    return picked
+
+
+def changed_box(previous, index_array):
+    """This function gives the (top, left, bottom, right) bounds of the pixels that differ between two frames of the same size, or None if none do"""
+    changed = previous != index_array
+    rows = np.flatnonzero(changed.any(axis=1))
+    if len(rows) == 0:
+        return
+    cols = np.flatnonzero(changed[rows[0]:rows[-1] + 1].any(axis=0))
+    return (int(rows[0]), int(cols[0]), int(rows[-1]) + 1, int(cols[-1]) + 1)
+
+
+class GifWriter:
+    """
+    This class writes palette-indexed frames to a looping .gif as they are appended, so the animation never has to be held in memory.
+    The palette is written into the file directly, so there is no color quantization step and the colors come out exact.
+    Use it as a context manager, or call close() when done.
+
+    With delta set, only the first frame is stored whole. Every frame after it is stored as the box of pixels that changed since the frame before,
+    drawn over it, with the pixels inside the box that didn't change left transparent. Consecutive frames of a simulation only differ in a few cells,
+    so this makes the file size and the encoding time follow how much is happening instead of the size of the domain.
+    """
+
+    def __init__(self, filepath, fps = 50, palette = None, delta = True):
+        self.filepath = filepath
+        self.duration = int(round(1000 / fps))
+        if palette is None:
+            palette = plotters.PALETTE_RGB8
+        self.palette = palette
+        self.delta = delta and (len(palette) < 256)
+        self.transparent = len(palette)  # An extra palette entry that's never a cell color, only used to see through delta frames
+        self.gif_palette = np.vstack([palette, [[255, 0, 255]]]) if self.delta else palette
+        self.size = None
+        self.previous = None
+        self.n_frames = 0
+        self.file = open(filepath, 'wb')
+
+    def append(self, index_array, changed = None):
+        """
+        This function encodes one palette-indexed frame and adds it to the end of the file.
+        changed can give the (top, left, bottom, right) box of the pixels that changed since the last frame (like plotters.FrameCanvas.changed_box,
+        which already follows the frame as it grows), otherwise it's worked out by comparing the two frames.
+        """
+        index_array = np.asarray(index_array, dtype=np.uint8)
+        size = (index_array.shape[1], index_array.shape[0])
+        if self.size is None:
+            self.size = size
+            header, _ = GifImagePlugin.getheader(indexed_to_image(index_array, self.gif_palette), info = {'duration': self.duration})
+            for block in header:
+                self.file.write(block)
+            self.file.write(b'!\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00')  # Loop forever
+        elif size != self.size:
+            print("Error: frame size does not match the first frame of the animation")
+            return
+
+        if (not self.delta) or (self.previous is None):
+            self.write_frame(index_array, (0, 0))
+        else:
+            if changed is None:
+                changed = changed_box(self.previous, index_array)
+            if changed is None:  # Nothing changed, but the frame still has to take up its time: one see-through pixel
+                self.write_frame(np.full((1, 1), self.transparent, dtype=np.uint8), (0, 0), transparency = self.transparent)
+            else:
+                top, left, bottom, right = changed
+                patch = index_array[top:bottom, left:right]
+                patch = np.where(patch == self.previous[top:bottom, left:right], self.transparent, patch).astype(np.uint8)
+                self.write_frame(patch, (left, top), transparency = self.transparent)
+
+        if self.delta:
+            if self.previous is None:
+                self.previous = index_array.copy()
+            elif changed is not None:
+                top, left, bottom, right = changed
+                self.previous[top:bottom, left:right] = index_array[top:bottom, left:right]
+        self.n_frames += 1
+
+    def write_frame(self, index_array, offset, **params):
+        """This function encodes a frame (or a patch of one placed at the (x, y) offset) into the file, drawn over the frame before it"""
+        image = indexed_to_image(index_array, self.gif_palette)
+        for block in GifImagePlugin.getdata(image, offset, duration = self.duration, disposal = 1, **params):
+            self.file.write(block)
+
+    def append_rgb(self, rgb_array):
+        """This function adds an 8-bit RGB frame (like a saved .png), snapping its colors onto the palette"""
+        self.append(rgb_to_indexed(rgb_array, self.palette))
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.file.write(b';')  # GIF trailer
+        self.file.close()
+        if self.n_frames == 0:
+            print("Error: no frames to animate")
+            os.remove(self.filepath)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class VideoWriter:
+    """
+    This class streams palette-indexed frames into a video file (like .mp4) through imageio's ffmpeg plugin, which needs the imageio-ffmpeg package.
+    Videos compress long runs far better than a .gif. Frames are padded with the background color to an even size, which the video codecs need.
+    """
+
+    def __init__(self, filepath, fps = 50, palette = None):
+        import imageio
+        if palette is None:
+            palette = plotters.PALETTE_RGB8
+        self.palette = palette
+        self.n_frames = 0
+        self.writer = imageio.get_writer(filepath, fps = fps, macro_block_size = 2)
+
+    def append(self, index_array, changed = None):
+        """This function adds one palette-indexed frame to the video (changed is only there to match GifWriter, video codecs find the changes themselves)"""
+        pad_rows = index_array.shape[0] % 2
+        pad_cols = index_array.shape[1] % 2
+        if pad_rows or pad_cols:
+            index_array = np.pad(index_array, ((0, pad_rows), (0, pad_cols)), mode='constant', constant_values=plotters.BACKGROUND)
+        self.writer.append_data(plotters.indexed_to_rgb(index_array, self.palette))
+        self.n_frames += 1
+
+    def append_rgb(self, rgb_array):
+        """This function adds an 8-bit RGB frame (like a saved .png), snapping its colors onto the palette"""
+        self.append(rgb_to_indexed(rgb_array, self.palette))
+
+    def close(self):
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_animation(filepath, fps = 50, palette = None, delta = True):
+    """
+    This function opens a streaming animation writer, a GifWriter for .gif files (storing only the changes between frames if delta is set)
+    and a VideoWriter for anything else (.mp4, .mkv, ...)
+    """
+    if filepath.lower().endswith('.gif'):
+        return GifWriter(filepath, fps, palette, delta)
+    return VideoWriter(filepath, fps, palette)
+
+
+def write_gif(filepath, index_frames, fps = 50, palette = None, delta = True):
+    """
+    This function saves palette-indexed frames as a looping .gif with a GifWriter.
+    index_frames can be any iterable (like a generator rendering frames on the fly), it is never held in memory all at once.
+    """
+    with GifWriter(filepath, fps, palette, delta) as writer:
+        for frame in index_frames:
+            writer.append(frame)
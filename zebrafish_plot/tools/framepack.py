@@ -0,0 +1,206 @@
+"""
+This module holds the frame pack format: every frame of a simulation in one compact binary file, instead of one text .csv per frame.
+Cells only take a few values (0, 1, 2), so by default they are packed 4 to a byte and then zlib compressed,
+which is a small fraction of the disk space of the .csv files and doesn't need any text parsing to read back.
+
+The file is laid out as:
+    MAGIC, then one block of cell data per frame, then a JSON index, then a footer of (index offset, index length, MAGIC).
+The index holds the name, shape, encoding, compression, position and crc32 of every frame, so any frame can be read on its own.
+Frames are appended one at a time and the index is only written on close, so a simulation never has to be held in memory to convert it.
+"""
+
+import os
+import json
+import zlib
+import struct
+import threading
+import numpy as np
+
+from . import importers, schema
+
+
+MAGIC = b'ZFPACK01'
+FOOTER = struct.Struct('<QQ8s')  # index offset, index length, MAGIC
+PACK_NAME = 'frames.zfp'  # What convert_simulation calls the pack inside a simulation folder
+ENCODINGS = ('2bit', 'int8')
+COMPRESSIONS = ('zlib', 'none')
+
+
+def pack_2bit(values):
+    """This function packs a flat array of values 0-3 four to a byte (the first value in the lowest bits)"""
+    values = np.asarray(values, dtype=np.uint8).ravel()
+    padded = np.zeros(-(-values.size // 4) * 4, dtype=np.uint8)
+    padded[:values.size] = values
+    quads = padded.reshape(-1, 4)
+    return quads[:, 0] | (quads[:, 1] << 2) | (quads[:, 2] << 4) | (quads[:, 3] << 6)
+
+
+def unpack_2bit(packed, count):
+    """This function undoes pack_2bit, returning the first count values as int8"""
+    packed = np.frombuffer(packed, dtype=np.uint8)
+    quads = np.empty((packed.size, 4), dtype=np.int8)
+    for k in range(4):
+        quads[:, k] = (packed >> (2 * k)) & 3
+    return quads.ravel()[:count]
+
+
+class FramePackWriter:
+    """
+    This class writes frames into a new frame pack one at a time. Use it as a context manager, or call close() to write the index.
+    encoding is '2bit' (4 cells a byte, falling back to 'int8' for any frame with codes outside 0-3) or 'int8',
+    and compression is 'zlib' (with the given level) or 'none'.
+    """
+
+    def __init__(self, filepath, encoding = '2bit', compression = 'zlib', level = 6):
+        if (encoding not in ENCODINGS) or (compression not in COMPRESSIONS):
+            raise ValueError("unknown encoding or compression: " + str(encoding) + ", " + str(compression))
+        self.filepath = filepath
+        self.encoding = encoding
+        self.compression = compression
+        self.level = level
+        self.index = []
+        self.file = open(filepath + '.tmp', 'wb')  # Only moved into place once the index is written, so readers never see half a pack
+        self.file.write(MAGIC)
+
+    def append(self, name, frame):
+        """
+        This function adds a frame (0D, 1D or 2D, as from importers.import_csv) under the given name.
+        Blank (NaN) cells, which can't be stored as integers, are saved as schema.EMPTY_CODE so they still draw as empty space.
+        """
+        frame = np.asarray(frame)
+        if frame.dtype.kind == 'f':
+            frame = np.where(np.isfinite(frame), frame, schema.EMPTY_CODE)
+        values = frame.astype(np.int8).ravel()
+
+        encoding = self.encoding
+        if (encoding == '2bit') and (values.size > 0) and ((values.min() < 0) or (values.max() > 3)):
+            encoding = 'int8'
+        data = pack_2bit(values).tobytes() if encoding == '2bit' else values.tobytes()
+        if self.compression == 'zlib':
+            data = zlib.compress(data, self.level)
+
+        self.index.append({'name': name, 'shape': list(frame.shape), 'encoding': encoding, 'compression': self.compression,
+                           'offset': self.file.tell(), 'length': len(data), 'crc32': zlib.crc32(data)})
+        self.file.write(data)
+
+    def close(self):
+        if self.file.closed:
+            return
+        index = json.dumps({'frames': self.index}).encode()
+        index_offset = self.file.tell()
+        self.file.write(index)
+        self.file.write(FOOTER.pack(index_offset, len(index), MAGIC))
+        self.file.close()
+        os.replace(self.filepath + '.tmp', self.filepath)
+
+    def abort(self):
+        """This function throws away the frames written so far, leaving any pack already at filepath as it was"""
+        if not self.file.closed:
+            self.file.close()
+        if os.path.isfile(self.filepath + '.tmp'):
+            os.remove(self.filepath + '.tmp')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is not None:  # Half a pack must never replace a whole one
+            self.abort()
+        else:
+            self.close()
+
+
+class FramePack:
+    """
+    This class reads a frame pack. Frames can be read by position or by name, in any order, and are returned with their original shape.
+    It is safe to read from several threads at once.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.file = open(filepath, 'rb')
+        self.lock = threading.Lock()
+        if self.file.read(len(MAGIC)) != MAGIC:
+            self.file.close()
+            raise ValueError(filepath + " is not a frame pack")
+        self.file.seek(-FOOTER.size, os.SEEK_END)
+        index_offset, index_length, magic = FOOTER.unpack(self.file.read(FOOTER.size))
+        if magic != MAGIC:
+            self.file.close()
+            raise ValueError(filepath + " is not a complete frame pack")
+        self.index = json.loads(self.read_block(index_offset, index_length).decode())['frames']
+        self.names = [entry['name'] for entry in self.index]
+        self.positions = {name: k for k, name in enumerate(self.names)}
+
+    def read_block(self, offset, length):
+        """This function reads length bytes starting at offset"""
+        with self.lock:
+            self.file.seek(offset)
+            return self.file.read(length)
+
+    def __len__(self):
+        return len(self.index)
+
+    def entry(self, key):
+        """This function gives the index entry of a frame, by position or by name"""
+        if isinstance(key, str):
+            key = self.positions[key]
+        return self.index[key]
+
+    def frame(self, key):
+        """This function reads and decodes one frame (by position or by name) into an int8 array"""
+        entry = self.entry(key)
+        data = self.read_block(entry['offset'], entry['length'])
+        if entry['compression'] == 'zlib':
+            data = zlib.decompress(data)
+        count = int(np.prod(entry['shape'], dtype=np.int64))
+        if entry['encoding'] == '2bit':
+            values = unpack_2bit(data, count)
+        else:
+            values = np.frombuffer(data, dtype=np.int8)[:count].copy()
+        return values.reshape(entry['shape'])
+
+    def __getitem__(self, key):
+        return self.frame(key)
+
+    def __iter__(self):
+        for k in range(len(self)):
+            yield self.frame(k)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def pack_path(simpath):
+    """This function gives where the frame pack of a simulation folder is (whether or not it exists yet)"""
+    return os.path.join(simpath, PACK_NAME)
+
+
+def has_pack(simpath):
+    """This function checks whether a simulation folder has a frame pack"""
+    return os.path.isfile(pack_path(simpath))
+
+
+def convert_simulation(simpath, filepath = None, encoding = '2bit', compression = 'zlib', level = 6):
+    """
+    This function packs the frames of a simulation folder into a frame pack (by default PACK_NAME inside the folder).
+    Frames already in the folder's pack are carried over, so a simulation that kept running after it was packed can be packed again
+    to add its new img*.csv files. Frames are read and written one at a time. The .csv files are left alone, delete them yourself once you're happy with the pack.
+    Returns the path of the pack, or None if there are no .csv files that aren't already packed.
+    """
+    if filepath is None:
+        filepath = pack_path(simpath)
+    pack = importers.open_pack(simpath)
+    packed = set() if pack is None else set(pack.names)
+    if all(name in packed for name in importers.pull_images(simpath)):
+        return
+    with FramePackWriter(filepath, encoding, compression, level) as writer:
+        for name in importers.simulation_frames(simpath):
+            writer.append(name, importers.read_frame(simpath, name, use_cache = False))
+    return filepath
@@ -4,8 +4,45 @@ Hopefully this works in the long run.
 """
 
 import os
+import time
+import glob
 import fnmatch
+import warnings
+import collections
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from . import framepack, profiling, schema
+
+
+FRAME_CACHE_DIR = '.frame_cache'  # Made inside each simulation folder to hold the decoded frames
+
+
+def read_frame_csv(filepath):
+    """
+    This function parses an MC_Simulation .csv of integer cell codes into an int8 numpy array in one pass with numpy's C parser.
+    Just like np.genfromtxt, a single value comes back as a 0D array and a single row or column as a 1D array.
+    Raises ValueError if the file isn't a plain grid of integers that fit in an int8, so callers can fall back to np.genfromtxt.
+    """
+    with open(filepath) as csv_file:
+        lines = [line.strip() for line in csv_file.read().splitlines()]
+    lines = [line for line in lines if line]
+    if len(lines) == 0:
+        raise ValueError("empty file")
+
+    n_cols = lines[0].count(',') + 1
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')  # numpy only warns when it can't parse the whole string
+        try:
+            data = np.fromstring(','.join(lines), dtype=np.int64, sep=',')  # Parsed wide, an int8 would silently wrap values like 200 around
+        except (DeprecationWarning, RuntimeWarning) as err:
+            raise ValueError(str(err))
+    if data.size != len(lines) * n_cols:
+        raise ValueError("rows are not all the same length")
+    if (data.size > 0) and ((data.min() < -128) or (data.max() > 127)):
+        raise ValueError("cell codes don't fit in an int8")
+    return np.squeeze(data.astype(np.int8).reshape(len(lines), n_cols))
+
 
 def import_csv(filepath):  # Imports array from csv
     """This function imports the .csv file into a numpy array"""
@@ -18,7 +55,57 @@ def import_csv(filepath):  # Imports array from csv
         return
     
     else:
-        return np.genfromtxt(filepath, delimiter = ',')
+        try:
+            return read_frame_csv(filepath)
+        except ValueError:  # Anything unusual (blank entries, decimals, ...) goes through the slow but forgiving parser
+            return np.genfromtxt(filepath, delimiter = ',')
+
+
+def frame_cache_path(filepath, cache_dir = None):
+    """
+    This function gives the .npy file the decoded frame of filepath is cached in.
+    The name holds the size and modification time of the .csv, so a changed .csv never matches an old cache file.
+    By default the cache lives in FRAME_CACHE_DIR inside the simulation folder.
+    """
+    folder, name = os.path.split(filepath)
+    if cache_dir is None:
+        cache_dir = os.path.join(folder, FRAME_CACHE_DIR)
+    stat = os.stat(filepath)
+    return os.path.join(cache_dir, '%s.%d.%d.npy' % (name, stat.st_size, stat.st_mtime_ns))
+
+
+def load_frame(filepath, use_cache = True, cache_dir = None):
+    """
+    This function imports a frame like import_csv, but keeps a .npy copy of the decoded frame (see frame_cache_path).
+    The next time the same .csv is loaded the copy is read instead, so the text is only ever parsed once.
+    """
+    if not use_cache:
+        return import_csv(filepath)
+    elif not(isinstance(filepath, str)) or not(os.path.isfile(filepath)):
+        return import_csv(filepath)  # Prints the error message
+
+    cache_path = frame_cache_path(filepath, cache_dir)
+    if os.path.isfile(cache_path):
+        try:
+            return np.load(cache_path)
+        except (ValueError, OSError):  # Half written or corrupted, just make it again
+            pass
+
+    frame = import_csv(filepath)
+    cache_folder, cache_name = os.path.split(cache_path)
+    os.makedirs(cache_folder, exist_ok=True)
+    csv_name = os.path.basename(filepath)
+    for stale in glob.glob(os.path.join(cache_folder, glob.escape(csv_name) + '.*.npy')):  # Old copies from before the .csv changed
+        if stale != cache_path:
+            try:
+                os.remove(stale)
+            except FileNotFoundError:  # Another process got to it first
+                pass
+    temp_path = cache_path + '.%d.tmp' % os.getpid()
+    with open(temp_path, 'wb') as cache_file:
+        np.save(cache_file, frame)
+    os.replace(temp_path, cache_path)  # So other processes never see a half written file
+    return frame
 
 
 def pull_images(basepath):  # Pulls a list of all file names that fit the criteria of "img_xxxx.csv"
@@ -31,5 +118,222 @@ def pull_images(basepath):  # Pulls a list of all file names that fit the criter
     return file_list
 
 
+_open_packs = {}  # Frame packs stay open between reads, keyed by path, along with the size and mtime they were opened at
+
+
+def open_pack(simpath):
+    """This function returns the open framepack.FramePack of a simulation folder (reopened if the file changed), or None if it has no pack"""
+    filepath = framepack.pack_path(simpath)
+    if not os.path.isfile(filepath):
+        return
+    stat = os.stat(filepath)
+    key = (stat.st_size, stat.st_mtime_ns)
+    cached = _open_packs.get(filepath)
+    if (cached is None) or (cached[0] != key):
+        if cached is not None:
+            cached[1].close()
+        _open_packs[filepath] = (key, framepack.FramePack(filepath))
+    return _open_packs[filepath][1]
+
+
+def simulation_frames(simpath):
+    """
+    This function lists the frames of a simulation folder in order, from its frame pack (see framepack) and its img*.csv files.
+    Frames that are in both are only listed once, so a simulation that kept running after it was packed still has all of its frames.
+    """
+    pack = open_pack(simpath)
+    if pack is None:
+        return pull_images(simpath)
+    return sorted(set(pack.names) | set(pull_images(simpath)))
+
+
+def settled_frames(simpath, names, settle = 2.0):
+    """
+    This function drops the frames of a simulation that may still be being written, for following simulations that are still running.
+    A .csv counts as finished once another img*.csv has been written after it (MC_Simulation writes frames one at a time),
+    or once it hasn't changed for settle seconds. Frames from a frame pack are always finished. Returns the finished names, in order.
+    """
+    pack = open_pack(simpath)
+    mtimes = {}
+    for name in names:
+        if (pack is not None) and (name in pack.positions):
+            continue
+        try:
+            mtimes[name] = os.stat(os.path.join(simpath, name)).st_mtime_ns
+        except OSError:  # Deleted (or renamed) since it was listed
+            mtimes[name] = None
+    if len(mtimes) == 0:
+        return list(names)
+    newest = max([mtime for mtime in mtimes.values() if mtime is not None], default=0)
+    now = time.time_ns()
+    return [name for name in names if (name not in mtimes)
+            or ((mtimes[name] is not None) and ((mtimes[name] < newest) or (now - mtimes[name] >= settle * 1e9)))]
+
+
+def read_frame(simpath, name, use_cache = True):
+    """This function reads one frame of a simulation folder by name, from its frame pack if the pack has it, or else from the .csv (see load_frame)"""
+    pack = open_pack(simpath)
+    if (pack is not None) and (name in pack.positions):
+        return pack.frame(name)
+    return load_frame(os.path.join(simpath, name), use_cache)
+
+
+def frame_source_size(simpath, name):
+    """This function gives the bytes on disk behind a frame: the size of its .csv, or of its block in the frame pack"""
+    pack = open_pack(simpath)
+    if (pack is not None) and (name in pack.positions):
+        return pack.entry(name)['length']
+    return os.path.getsize(os.path.join(simpath, name))
+
+
+class SimulationReader:
+    """
+    This class reads the frames of a simulation folder lazily and in order, with a pool of background threads reading ahead,
+    so that the next frames are already coming off the disk (and being parsed) while the current one is rendered.
+
+    Iterating gives the decoded frames (items() gives (name, frame) pairs). At most read_ahead frames are in flight or waiting at a time,
+    so memory stays bounded however long the simulation is. Index it with an integer to read one frame,
+    or with a slice (reader[100:200:5]) to get a new reader over just those frames. step picks every step-th frame from the start.
+    """
+
+    def __init__(self, simpath, names = None, step = 1, read_ahead = 8, threads = 2, use_cache = True):
+        self.simpath = simpath
+        if names is None:
+            names = simulation_frames(simpath)
+        self.names = list(names)[::step]
+        self.read_ahead = max(1, read_ahead)
+        self.threads = max(1, threads)
+        self.use_cache = use_cache
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return SimulationReader(self.simpath, self.names[key], 1, self.read_ahead, self.threads, self.use_cache)
+        return self.read(self.names[key])
+
+    def read(self, name):
+        """This function reads one frame by name (this is what the background threads run)"""
+        with profiling.stage('import', sim = self.simpath, frame = name, frames = 1) as timer:
+            frame = read_frame(self.simpath, name, self.use_cache)
+            if timer.enabled:
+                timer.add(bytes_read = frame_source_size(self.simpath, name))
+        return frame
+
+    def items(self):
+        """This function yields (name, frame) for every frame in order, reading ahead in the background"""
+        pending = collections.deque()
+        names = iter(self.names)
+        pool = ThreadPoolExecutor(max_workers = self.threads)
+        try:
+            for name in names:
+                pending.append((name, pool.submit(self.read, name)))
+                if len(pending) >= self.read_ahead:
+                    break
+            while pending:
+                name, future = pending.popleft()
+                for next_name in names:  # Keeps the queue topped up before waiting on the oldest frame
+                    pending.append((next_name, pool.submit(self.read, next_name)))
+                    break
+                yield name, future.result()
+        finally:
+            for _, future in pending:
+                future.cancel()
+            pool.shutdown(wait = True)
+
+    def __iter__(self):
+        for _, frame in self.items():
+            yield frame
+
+
+FRAME_STACK_NAME = 'frame_stack.npy'  # Stored in FRAME_CACHE_DIR next to the cached frames
+FRAME_SHAPES_NAME = 'frame_shapes.npy'
+
+
+def frame_extent(frame):
+    """This function gives the (rows, cols) a frame covers when it's drawn, with a single value as 1x1 and a vector as a single column"""
+    if frame.ndim == 0:
+        return (1, 1)
+    elif frame.ndim == 1:
+        return (frame.shape[0], 1)
+    return frame.shape[:2]
+
+
+def build_frame_stack(simpath, stack_dir = None):
+    """
+    This function consolidates every frame of the simulation in simpath into one int8 array of shape (time, rows, cols) saved as a .npy file.
+    Frames grow over time, so each one is written into the top-left corner of its slot and the rest is filled with schema.EMPTY_CODE.
+    Alongside it goes a shape table with one (ndim, rows, cols) row per frame, so the original frames can be sliced back out (see stack_frame).
+    The stack is filled frame by frame through a memory map, so the simulation never has to fit in memory. Returns the same as load_frame_stack.
+    """
+    if stack_dir is None:
+        stack_dir = os.path.join(simpath, FRAME_CACHE_DIR)
+    img_list = simulation_frames(simpath)
+    if len(img_list) == 0:
+        print("Error: no frames in " + simpath)
+        return
+
+    shapes = np.zeros((len(img_list), 3), dtype=np.int64)  # First pass just finds the sizes (and fills the frame cache)
+    for t, name in enumerate(img_list):
+        frame = read_frame(simpath, name)
+        shapes[t] = (frame.ndim,) + frame_extent(frame)
+
+    os.makedirs(stack_dir, exist_ok=True)
+    stack_path = os.path.join(stack_dir, FRAME_STACK_NAME)
+    stack = np.lib.format.open_memmap(stack_path, mode='w+', dtype=np.int8,
+                                      shape=(len(img_list), int(shapes[:, 1].max()), int(shapes[:, 2].max())))
+    for t, name in enumerate(img_list):
+        frame = read_frame(simpath, name)
+        if frame.dtype.kind == 'f':  # Blank entries from np.genfromtxt can't be stored as int8
+            frame = np.where(np.isfinite(frame), frame, schema.EMPTY_CODE)
+        stack[t] = schema.EMPTY_CODE
+        stack[t, :shapes[t, 1], :shapes[t, 2]] = frame.reshape(shapes[t, 1], shapes[t, 2])
+    stack.flush()
+    del stack
+    np.save(os.path.join(stack_dir, FRAME_SHAPES_NAME), shapes)
+    return load_frame_stack(simpath, stack_dir)
+
+
+def load_frame_stack(simpath, stack_dir = None):
+    """
+    This function opens the stack made by build_frame_stack read-only as a memory map, along with its shape table.
+    Slicing the stack (a space-time cut, a run of frames, ...) only reads the part of the file that's needed, and never copies it.
+    STPlotter.stPlotFrom3Dmat wants time on the last axis, which is just stack.transpose(1, 2, 0).
+    Returns (stack, shapes), or None if there is no stack yet.
+    """
+    if stack_dir is None:
+        stack_dir = os.path.join(simpath, FRAME_CACHE_DIR)
+    stack_path = os.path.join(stack_dir, FRAME_STACK_NAME)
+    shapes_path = os.path.join(stack_dir, FRAME_SHAPES_NAME)
+    if not (os.path.isfile(stack_path) and os.path.isfile(shapes_path)):
+        print("Error: no frame stack exists. Use build_frame_stack to make one")
+        return
+    return np.load(stack_path, mmap_mode='r'), np.load(shapes_path)
+
+
+def open_frame_stack(simpath, stack_dir = None):
+    """This function loads the frame stack of simpath, building it first if it's missing or any frame .csv (or the frame pack) is newer than it"""
+    if stack_dir is None:
+        stack_dir = os.path.join(simpath, FRAME_CACHE_DIR)
+    shapes_path = os.path.join(stack_dir, FRAME_SHAPES_NAME)
+    img_list = simulation_frames(simpath)
+    if os.path.isfile(shapes_path) and os.path.isfile(os.path.join(stack_dir, FRAME_STACK_NAME)):
+        built = os.path.getmtime(shapes_path)
+        sources = [os.path.join(simpath, name) for name in pull_images(simpath)]
+        if framepack.has_pack(simpath):
+            sources.append(framepack.pack_path(simpath))
+        newest = max([os.path.getmtime(source) for source in sources], default=0)
+        if (newest <= built) and (len(np.load(shapes_path)) == len(img_list)):
+            return load_frame_stack(simpath, stack_dir)
+    return build_frame_stack(simpath, stack_dir)
 
 
+def stack_frame(stack, shapes, t):
+    """This function returns frame t of a frame stack as a view with its original shape (0D, 1D or 2D), without copying it"""
+    ndim, rows, cols = shapes[t]
+    if ndim == 0:
+        return stack[t, 0:1, 0:1].reshape(())
+    elif ndim == 1:
+        return stack[t, :rows, 0]
+    return stack[t, :rows, :cols]
@@ -2,13 +2,41 @@
 This module contains all of the functions for plotting the zebrafish experiments.
 It contains simple plotters that will work for one array at a time, and more complex ones that will allow for size adjustment.
 The more complex ones should be allowed for us to make animations.
+Everything here only needs NumPy (no matplotlib), so it's quick to import in worker processes and works on machines without a display.
 """
 
 
 import numpy as np
-import matplotlib.pyplot as plt
 import math
 
+from . import schema, rendercache
+
+
+# The cell-state schema every frame is drawn with (see schema.CellSchema and use_schema), compiled from the config into:
+SCHEMA = schema.CellSchema()
+PALETTE = SCHEMA.palette  # Colors of every cell type then the background (blue by default, for space that isn't part of the current simulation)
+BACKGROUND = SCHEMA.background  # The palette index of the background
+PALETTE_RGB8 = SCHEMA.palette_rgb8  # The same colors as 8-bit values, which is what the image and animation writers take
+
+PLACEMENTS = ('to_size', 'centering', 'grow_right', 'grow_left')
+
+
+def use_schema(config = None):
+    """
+    This function switches every renderer over to the cell-state schema of a config (see schema.DEFAULT_CONFIG, None is the built-in one),
+    or to an already compiled schema.CellSchema. Palettes passed around after this are the new ones.
+    """
+    global SCHEMA, PALETTE, BACKGROUND, PALETTE_RGB8
+    if not isinstance(config, schema.CellSchema):
+        if (config or schema.DEFAULT_CONFIG) == SCHEMA.config:
+            return SCHEMA
+        config = schema.CellSchema(config)
+    SCHEMA = config
+    PALETTE = SCHEMA.palette
+    BACKGROUND = SCHEMA.background
+    PALETTE_RGB8 = SCHEMA.palette_rgb8
+    return SCHEMA
+
 
 def sim_to_plot(sim_array):
     """This function outputs an array of the correct size to work with matplotlib.pyplot's imshow"""
@@ -21,261 +49,308 @@ def simple_plotter(sim_array, plot_array):
     """
     This function fills the plot array with values (0-1) for the coloring of the different chromaphores.
 
-    For the simple case, the following is observed:
+    For the simple case (the built-in schema), the following is observed:
         White pixels are empty nodes ('S' in original paper, 0 in sim_array)
         Yellow pixels are xanthophores ('X' in original paper, 1 in sim_array)
         Black pixels are melanophores ('M' in original paper, 2 in sim_array)
+    Cells that aren't any known cell type are left as they were in plot_array.
     """
     if (sim_array.shape[0] == plot_array.shape[0]) & (sim_array.shape[1] == plot_array.shape[1]):
-        plot_array[sim_array == 0, :] = [1, 1, 1]
-        plot_array[sim_array == 1, :] = [1, 1, 0]
-        plot_array[sim_array == 2, :] = [0, 0, 0]
+        codes = color_codes(sim_array)
+        known = codes != BACKGROUND
+        plot_array[known, :] = PALETTE[codes[known]]
         return plot_array
     else:
         print("Error: plot and simulation dimensions do not match")
         return
 
 
-def plot_to_size(sim_array, final_size):
+def color_codes(sim_array, out = None):
     """
-    This function preallocates an array of size final_size (should be a tuple) and fills it with the appropriate pixel values.
-    For the pixels that are actually in the sim_array, will follow color scheme listed in simple_plotter.
-    For pixels that are outside of the realm of the sim_array, they will be plotted in blue.
+    This function turns an array of cell codes into indices of PALETTE, with one lookup into the schema's compiled table (see schema.CellSchema.indices).
+    Anything that isn't a known cell code (including NaN or fractional values) is sent to the blue background, same as the old loops.
+    Pass a uint8 array (or view) of the same shape as out to write the indices straight into it.
     """
-    plot_array = np.zeros((final_size[0], final_size[1], 3))
-    plot_array[:, :, 2] = np.ones(final_size)  # makes everything blue (will overlay later)
-    sim_size = sim_array.shape
-
-    if sim_array.ndim == 0 :  # If just one value
-        if sim_array == np.array(0):
-            plot_array[0, 0, :] = [1, 1, 1]
-        elif sim_array == np.array(1):
-            plot_array[0, 0, :] = [1, 1, 0]
-        elif sim_array == np.array(2):
-            plot_array[0, 0, :] = [0, 0, 0]
-        return plot_array
-    
-    elif ((sim_array.ndim == 1) & (len(sim_array) <= final_size[0])) :  # If just a shorter vector
-        for i in range(len(sim_array)):
-            if sim_array[i] == 0:
-                plot_array[i, 0, :] = [1, 1, 1]
-            elif sim_array[i] == 1:
-                plot_array[i, 0, :] = [1, 1, 0]
-            elif sim_array[i] == 2:
-                plot_array[i, 0, :] = [0, 0, 0]
-        return plot_array
-  
+    return SCHEMA.indices(sim_array, out)
+
+
+def as_2D(sim_array):
+    """
+    This function views a 0D or 1D simulation array as a 2D block, so every frame goes through the same rendering path.
+    A single value becomes a 1x1 block and a vector becomes a single column, which is how the plotters have always drawn them.
+    """
+    sim_array = np.asarray(sim_array)
+    if sim_array.ndim == 0:
+        return sim_array.reshape(1, 1)
+    elif sim_array.ndim == 1:
+        return sim_array.reshape(-1, 1)
+    return sim_array
 
-    elif ((sim_array.ndim == 1) & (len(sim_array) > final_size[0])) :
+
+def placement_offset(sim_shape, final_size, placement = 'to_size'):
+    """
+    This function works out where the top-left corner of a frame of shape sim_shape lands inside a canvas of size final_size.
+    placement is one of PLACEMENTS:
+        'to_size' puts the frame in the top-left corner (plot_to_size)
+        'centering' puts the frame in the center (plot_centering)
+        'grow_right' centers the rows and pins the left column, so the domain grows to the right (plot_grow2D_right)
+        'grow_left' centers the rows and pins the right column, so the domain grows to the left (plot_grow2D_left)
+    Returns (row_shift, col_shift), or None (with an error message) if the frame is bigger than final_size.
+    """
+    ndim = len(sim_shape)
+    if ndim > 2:
+        print("Error on sizing")
+        return
+    elif (ndim == 1) and (sim_shape[0] > final_size[0]):
         print("Error: wrong final dimension size chosen")
         return
-
-    elif (final_size[0] < sim_size[0]) | (final_size[1] < sim_size[1]) :
+    elif (ndim == 2) and ((final_size[0] < sim_shape[0]) | (final_size[1] < sim_shape[1])):
         print("Error: wrong final dimension size chosen")
         return
 
+    rows = sim_shape[0] if ndim > 0 else 1
+    cols = sim_shape[1] if ndim > 1 else 1
+    row_center = (final_size[0] - 1) // 2
+    col_center = (final_size[1] - 1) // 2
+
+    if placement == 'to_size':
+        row_shift, col_shift = 0, 0
+    elif placement == 'centering':
+        if ndim == 1:  # Vectors start at the center row and are shifted along the columns by their length, as they always have been
+            row_shift = row_center  # (so long vectors run off the bottom, and only the part that fits gets drawn)
+            col_shift = col_center - (rows - 1) // 2
+            if col_shift < 0:  # The original loops wrapped negative column indices around to the right edge
+                col_shift += final_size[1]
+            if col_shift < 0:  # Too long for the canvas even after wrapping around once, the original loops raised an IndexError here
+                print("Error: wrong final dimension size chosen")
+                return
+        else:
+            row_shift = row_center - (rows - 1) // 2
+            col_shift = col_center - (cols - 1) // 2
+    elif placement == 'grow_right':
+        row_shift = row_center - (rows - 1) // 2
+        col_shift = 0
+    elif placement == 'grow_left':
+        row_shift = row_center - (rows - 1) // 2
+        col_shift = final_size[1] - cols
     else:
-        for i in range(sim_size[0]):
-            for j in range(sim_size[1]):
-                if sim_array[i, j] == 0:
-                    plot_array[i, j, :] = [1, 1, 1]
-                elif sim_array[i, j] == 1:
-                    plot_array[i, j, :] = [1, 1, 0]
-                elif sim_array[i, j] == 2:
-                    plot_array[i, j, :] = [0, 0, 0]
-        return plot_array
+        print("Error: unknown placement " + str(placement))
+        return
+    return int(row_shift), int(col_shift)
 
 
-def plot_centering(sim_array, final_size):
+def render_indexed(sim_array, final_size, placement = 'to_size', out = None):
     """
-    This function will plot the sim_array into a matrix of size final_size. It will be plotted into the center of the final matrix.
-    Then, just as normal plotting, it will color the output matrix in accordance with the simple_plotter function.
-    sim_array should be a 2D array, and final_size should be a tuple. The output will be a 3D RGB array.
+    This function is the rendering engine behind all of the sized plotters.
+    It preallocates a canvas of size final_size filled with BACKGROUND, then writes the PALETTE index of every cell in sim_array into the region it covers.
+    See placement_offset for the placement options.
+    Pass a uint8 array of size final_size as out to draw into it instead of allocating a new canvas every call.
+    The output is a 2D uint8 array (1 byte per pixel) that can be expanded to colors with indexed_to_rgb, or None if the frame doesn't fit.
     """
-
-    plot_array = np.zeros((final_size[0], final_size[1], 3))
-    plot_array[:, :, 2] = np.ones(final_size) # makes everything blue, will overlay later
-    sim_size = sim_array.shape
-    final_center = [np.floor((final_size[0] -1) / 2), np.floor((final_size[1] - 1) / 2)]
-    
-    #  Here is where we figure out the centering
-    if sim_array.ndim ==0:
-        row_shift = final_center[0]
-        col_shift = final_center[1]
-    elif len(sim_array.shape) == 1:  # If a 1D column
-        row_shift = final_center[0]
-        col_shift = final_center[1] - np.floor((sim_size[0] - 1) / 2)
-    elif sim_array.ndim == 2:  # If either a 1D row or a 2D array
-        row_shift = final_center[0] - np.floor((sim_array.shape[0] - 1) / 2)
-        col_shift = final_center[1] - np.floor((sim_array.shape[1] - 1) / 2)
-    else:
-        print("Error on sizing")
+    sim_array = np.asarray(sim_array)
+    offset = placement_offset(sim_array.shape, final_size, placement)
+    if offset is None:
         return
-    
-    #  Now, fill in the plot as needed
-    if sim_array.ndim == 0:
-        if sim_array == np.array(0):
-            plot_array[int(row_shift), int(col_shift), :] = [1, 1, 1]
-        elif sim_array == np.array(1):
-            plot_array[int(row_shift), int(col_shift), :] = [1, 1, 0]
-        elif sim_array == np.array(2):
-            plot_array[int(row_shift), int(col_shift), :] = [0, 0, 0]
-        return plot_array
 
-    elif ((sim_array.ndim == 1) & (len(sim_array) <= final_size[0])) :  # If just a shorter vector
-        for i in range(len(sim_array)):
-            if sim_array[i] == 0:
-                plot_array[int(i + row_shift), int(col_shift), :] = [1, 1, 1]
-            elif sim_array[i] == 1:
-                plot_array[int(i + row_shift), int(col_shift), :] = [1, 1, 0]
-            elif sim_array[i] == 2:
-                plot_array[int(i + row_shift), int(col_shift), :] = [0, 0, 0]
-        return plot_array
-    
-    elif ((sim_array.ndim == 1) & (len(sim_array) > final_size[0])) :
-        print("Error: wrong final dimension size chosen")
-        return
+    row_shift, col_shift = offset
+    block = as_2D(sim_array)[:final_size[0] - row_shift, :final_size[1] - col_shift]
+    if out is None:
+        out = np.empty((final_size[0], final_size[1]), dtype=np.uint8)
+    out.fill(BACKGROUND)  # makes everything blue (will overlay later)
+    target = out[row_shift:row_shift + block.shape[0], col_shift:col_shift + block.shape[1]]
+    color_codes(block[:target.shape[0], :target.shape[1]], target)
+    return out
 
-    elif (final_size[0] < sim_size[0]) | (final_size[1] < sim_size[1]) :
-        print("Error: wrong final dimension size chosen")
-        return
 
-    else:
-        for i in range(sim_size[0]):
-            for j in range(sim_size[1]):
-                if sim_array[i, j] == 0:
-                    plot_array[int(i + row_shift), int(j + col_shift), :] = [1, 1, 1]
-                elif sim_array[i, j] == 1:
-                    plot_array[int(i + row_shift), int(j + col_shift), :] = [1, 1, 0]
-                elif sim_array[i, j] == 2:
-                    plot_array[int(i + row_shift), int(j + col_shift), :] = [0, 0, 0]
-        return plot_array
-    
+class FrameCanvas:
+    """
+    This class renders the frames of one simulation into the same canvas over and over, instead of allocating and filling a new one for every frame.
+    Only the region the frame covers is written (plus clearing whatever the last frame covered that this one doesn't),
+    the background around it is left from the frames before.
+
+    With track_changes set, each render also compares the frame against the last one, and changed_box holds the (top, left, bottom, right)
+    bounds of the pixels that changed (None if nothing did). If palette is given (like PALETTE or PALETTE_RGB8), an RGB copy of the canvas
+    is kept in rgb, and only the changed box of it is colored again each frame (this turns track_changes on).
+    The arrays returned are the canvas itself, so copy them if they need to outlive the next call of render.
+    """
 
-def plot_grow2D_right(sim_array, final_size):
+    def __init__(self, final_size, placement = 'to_size', palette = None, track_changes = False):
+        self.final_size = (int(final_size[0]), int(final_size[1]))
+        self.placement = placement
+        self.index = np.full(self.final_size, BACKGROUND, dtype=np.uint8)
+        self.palette = palette
+        self.track_changes = track_changes or (palette is not None)
+        self.rgb = None
+        if palette is not None:
+            self.rgb = indexed_to_rgb(self.index, palette)
+        self.region = None  # (top, left, bottom, right) of the canvas the last frame covered
+        self.changed_box = None
+
+    def render(self, sim_array):
+        """This function draws the next frame into the canvas and returns the canvas (palette indices), or None if the frame doesn't fit"""
+        sim_array = np.asarray(sim_array)
+        offset = placement_offset(sim_array.shape, self.final_size, self.placement)
+        if offset is None:
+            return
+
+        row_shift, col_shift = offset
+        block = as_2D(sim_array)[:self.final_size[0] - row_shift, :self.final_size[1] - col_shift]
+        region = (row_shift, col_shift, row_shift + block.shape[0], col_shift + block.shape[1])
+        target = self.index[region[0]:region[2], region[1]:region[3]]
+        block = block[:target.shape[0], :target.shape[1]]
+        previous = self.region
+        cleared = None
+        if (previous is not None) and not ((region[0] <= previous[0]) and (region[1] <= previous[1])
+                                           and (previous[2] <= region[2]) and (previous[3] <= region[3])):
+            cleared = previous  # The last frame covered cells this one doesn't (like a shrinking or shifting frame)
+            self.index[cleared[0]:cleared[2], cleared[1]:cleared[3]] = BACKGROUND
+
+        box = None
+        if not self.track_changes:
+            color_codes(block, target)
+        else:
+            block = color_codes(block)
+            changed_rows = np.flatnonzero((target != block).any(axis=1))
+            if len(changed_rows) > 0:
+                top, bottom = changed_rows[0], changed_rows[-1] + 1
+                changed_cols = np.flatnonzero((target[top:bottom] != block[top:bottom]).any(axis=0))
+                box = (region[0] + top, region[1] + changed_cols[0], region[0] + bottom, region[1] + changed_cols[-1] + 1)
+            if cleared is not None:  # Cleared cells changed too
+                box = cleared if box is None else (min(box[0], cleared[0]), min(box[1], cleared[1]), max(box[2], cleared[2]), max(box[3], cleared[3]))
+            target[...] = block  # A straight copy of the region is faster than picking out the changed cells
+
+        if box is not None:
+            box = tuple(int(side) for side in box)
+            if self.rgb is not None:
+                top, left, bottom, right = box
+                indexed_to_rgb(self.index[top:bottom, left:right], self.palette, self.rgb[top:bottom, left:right])
+        self.changed_box = box
+        self.region = region
+        return self.index
+
+
+def downsample_factor(final_size, target_size):
+    """This function gives the smallest whole-number factor that shrinks final_size to fit inside target_size (rows, cols)"""
+    return max(1, int(math.ceil(max(final_size[0] / target_size[0], final_size[1] / target_size[1]))))
+
+
+def render_downsampled(sim_array, final_size, placement = 'to_size', factor = None, target_size = None, method = 'mode', tile_rows = 64):
     """
-    This function will plot the sim_array into a matrix of size final_size. It will be plotted into the center of the rows, but the left column will be
-    on the left of the domain, so it's always growing on one side.
-    Then, just as normal plotting, it will color the output matrix in accordance with the simple_plotter function.
-    sim_array should be a 2D array, and final_size should be a tuple. The output will be a 3D RGB array.
+    This function renders like render_indexed, but shrinks the image by a whole-number factor before it's ever colored,
+    either given directly or worked out to fit target_size (see downsample_factor).
+    With method = 'mode', each factor x factor block of cells becomes whichever cell type (or background) is most common in it,
+    which keeps stripes at least factor cells wide looking right. With method = 'stride', the top-left cell of each block is just picked (faster).
+    The full size canvas is never made: it's built tile_rows output rows at a time, so memory stays bounded however big the domain is.
+    Shrunk frames are kept in the render cache (see rendercache.py), so a frame that's exactly like one done before isn't worked out again
+    (those come back read-only).
+    Returns a uint8 array of palette indices of size ceil(final_size / factor), or None if the frame doesn't fit.
     """
+    if factor is None:
+        factor = 1 if target_size is None else downsample_factor(final_size, target_size)
+    if factor == 1:
+        return render_indexed(sim_array, final_size, placement)
+    if method not in ('mode', 'stride'):
+        print("Error: unknown downsampling method " + str(method))
+        return
 
-    plot_array = np.zeros((final_size[0], final_size[1], 3))
-    plot_array[:, :, 2] = np.ones(final_size) # makes everything blue, will overlay later
-    sim_size = sim_array.shape
-    row_center = np.floor((final_size[0] -1) / 2)
-    
-    #  Here is where we figure out the centering
-    if sim_array.ndim ==0:
-        row_shift = row_center
-    elif len(sim_array.shape) == 1:  # If a 1D column
-        row_shift = row_center - np.floor((sim_size[0] - 1) / 2)
-    elif sim_array.ndim == 2:  # If either a 1D row or a 2D array
-        row_shift = row_center - np.floor((sim_size[0] - 1) / 2)
-    else:
-        print("Error on sizing")
+    sim_array = np.asarray(sim_array)
+    key = None
+    if rendercache.CACHE.enabled:
+        key = rendercache.frame_key('downsampled', [sim_array, SCHEMA.lut], final_size = list(final_size), placement = placement,
+                                    factor = factor, method = method)
+        cached = rendercache.CACHE.get(key)
+        if cached is not None:
+            return cached
+    offset = placement_offset(sim_array.shape, final_size, placement)
+    if offset is None:
         return
+    row_shift, col_shift = offset
+    block = as_2D(sim_array)[:final_size[0] - row_shift, :final_size[1] - col_shift]
+
+    out_rows = -(-final_size[0] // factor)
+    out_cols = -(-final_size[1] // factor)
+    out = np.empty((out_rows, out_cols), dtype=np.uint8)
+    n_codes = len(PALETTE)
+    for out_start in range(0, out_rows, tile_rows):
+        out_stop = min(out_start + tile_rows, out_rows)
+        top = out_start * factor  # Rows of the full size canvas this tile covers
+        bottom = out_stop * factor
+        tile = np.full((bottom - top, out_cols * factor), n_codes, dtype=np.uint8)  # Cells past the edge of the canvas get an extra code that never wins
+        tile[:min(bottom, final_size[0]) - top, :final_size[1]] = BACKGROUND
+        first = max(top, row_shift)
+        last = min(bottom, row_shift + block.shape[0])
+        if first < last:
+            tile[first - top:last - top, col_shift:col_shift + block.shape[1]] = color_codes(block[first - row_shift:last - row_shift])
+
+        if method == 'stride':
+            out[out_start:out_stop] = tile[::factor, ::factor]
+        else:
+            cells = tile.reshape(out_stop - out_start, factor, out_cols, factor).transpose(0, 2, 1, 3).reshape(-1, factor * factor)
+            bins = np.arange(cells.shape[0])[:, np.newaxis] * (n_codes + 1) + cells  # One count per (block, code), all in one bincount
+            counts = np.bincount(bins.ravel(), minlength=cells.shape[0] * (n_codes + 1)).reshape(-1, n_codes + 1)
+            out[out_start:out_stop] = counts[:, :n_codes].argmax(axis=1).reshape(out_stop - out_start, out_cols)
+    if key is not None:
+        rendercache.CACHE.put(key, out)
+    return out
+
+
+def indexed_to_rgb(index_array, palette = None, out = None):
+    """
+    This function expands a frame from render_indexed into an RGB array with one lookup into palette.
+    The default gives 8-bit colors for image writers, pass PALETTE to get the 0-1 floats that imshow and the old plotters use.
+    Pass an array of shape index_array.shape + (3,) (and the palette's dtype) as out to fill it instead of allocating a new one.
+    """
+    if palette is None:
+        palette = PALETTE_RGB8
+    return np.take(palette, index_array, axis=0, out=out)
 
-    #  Now, fill in the plot as needed
-    if sim_array.ndim == 0:
-        if sim_array == np.array(0):
-            plot_array[int(row_shift), 0, :] = [1, 1, 1]
-        elif sim_array == np.array(1):
-            plot_array[int(row_shift), 0, :] = [1, 1, 0]
-        elif sim_array == np.array(2):
-            plot_array[int(row_shift), 0, :] = [0, 0, 0]
-        return plot_array
 
-    elif ((sim_array.ndim == 1) & (len(sim_array) <= final_size[0])) :  # If just a shorter vector
-        for i in range(len(sim_array)):
-            if sim_array[i] == 0:
-                plot_array[int(i + row_shift), 0, :] = [1, 1, 1]
-            elif sim_array[i] == 1:
-                plot_array[int(i + row_shift), 0, :] = [1, 1, 0]
-            elif sim_array[i] == 2:
-                plot_array[int(i + row_shift), 0, :] = [0, 0, 0]
-        return plot_array
-    
-    elif ((sim_array.ndim == 1) & (len(sim_array) > final_size[0])) :
-        print("Error: wrong final dimension size chosen")
+def render_frame(sim_array, final_size, placement = 'to_size', out = None):
+    """
+    This function renders sim_array with render_indexed and expands it into a 3D RGB array of 0-1 floats, matching the old plotters.
+    Pass a float array of shape final_size + (3,) as out to fill it instead of allocating a new one.
+    Returns None if the frame doesn't fit.
+    """
+    index_array = render_indexed(sim_array, final_size, placement)
+    if index_array is None:
         return
+    return indexed_to_rgb(index_array, PALETTE, out)
 
-    elif (final_size[0] < sim_size[0]) | (final_size[1] < sim_size[1]) :
-        print("Error: wrong final dimension size chosen")
-        return
 
-    else:
-        for i in range(sim_size[0]):
-            for j in range(sim_size[1]):
-                if sim_array[i, j] == 0:
-                    plot_array[int(i + row_shift), j, :] = [1, 1, 1]
-                elif sim_array[i, j] == 1:
-                    plot_array[int(i + row_shift), j, :] = [1, 1, 0]
-                elif sim_array[i, j] == 2:
-                    plot_array[int(i + row_shift), j, :] = [0, 0, 0]
-        return plot_array
+def plot_to_size(sim_array, final_size, out = None):
+    """
+    This function preallocates an array of size final_size (should be a tuple) and fills it with the appropriate pixel values.
+    For the pixels that are actually in the sim_array, will follow color scheme listed in simple_plotter.
+    For pixels that are outside of the realm of the sim_array, they will be plotted in blue.
+    Like all of the sized plotters, it can fill a preallocated float array of shape final_size + (3,) passed as out, instead of making a new one.
+    """
+    return render_frame(sim_array, final_size, 'to_size', out)
 
 
-def plot_grow2D_left(sim_array, final_size):
+def plot_centering(sim_array, final_size, out = None):
     """
-    This function will plot the sim_array into a matrix of size final_size. It will be plotted into the center of the rows, but the right column will be
-    on the right of the domain, so it's always growing on one side. It's basically the other-side alternate to the above function.
+    This function will plot the sim_array into a matrix of size final_size. It will be plotted into the center of the final matrix.
     Then, just as normal plotting, it will color the output matrix in accordance with the simple_plotter function.
     sim_array should be a 2D array, and final_size should be a tuple. The output will be a 3D RGB array.
     """
+    return render_frame(sim_array, final_size, 'centering', out)
 
-    plot_array = np.zeros((final_size[0], final_size[1], 3))
-    plot_array[:, :, 2] = np.ones(final_size) # makes everything blue, will overlay later
-    sim_size = sim_array.shape
-    row_center = np.floor((final_size[0] -1) / 2)
-    
-    #  Here is where we figure out the centering
-    if sim_array.ndim ==0:
-        row_shift = row_center
-    elif len(sim_array.shape) == 1:  # If a 1D column
-        row_shift = row_center - np.floor((sim_size[0] -1) / 2)
-    elif sim_array.ndim == 2:  # If either a 1D row or a 2D array
-        row_shift = row_center - np.floor((sim_size[0] - 1) / 2)
-    else:
-        print("Error on sizing")
-        return
-
-    #  Now, fill in the plot as needed
-    if sim_array.ndim == 0:
-        if sim_array == np.array(0):
-            plot_array[int(row_shift), -1, :] = [1, 1, 1]
-        elif sim_array == np.array(1):
-            plot_array[int(row_shift), -1, :] = [1, 1, 0]
-        elif sim_array == np.array(2):
-            plot_array[int(row_shift), -1, :] = [0, 0, 0]
-        return plot_array
 
-    elif ((sim_array.ndim == 1) & (len(sim_array) <= final_size[0])) :  # If just a shorter vector
-        for i in range(len(sim_array)):
-            if sim_array[i] == 0:
-                plot_array[int(i + row_shift), -1, :] = [1, 1, 1]
-            elif sim_array[i] == 1:
-                plot_array[int(i + row_shift), -1, :] = [1, 1, 0]
-            elif sim_array[i] == 2:
-                plot_array[int(i + row_shift), -1, :] = [0, 0, 0]
-        return plot_array
-    
-    elif ((sim_array.ndim == 1) & (len(sim_array) > final_size[0])) :
-        print("Error: wrong final dimension size chosen")
-        return
+def plot_grow2D_right(sim_array, final_size, out = None):
+    """
+    This function will plot the sim_array into a matrix of size final_size. It will be plotted into the center of the rows, but the left column will be
+    on the left of the domain, so it's always growing on one side.
+    Then, just as normal plotting, it will color the output matrix in accordance with the simple_plotter function.
+    sim_array should be a 2D array, and final_size should be a tuple. The output will be a 3D RGB array.
+    """
+    return render_frame(sim_array, final_size, 'grow_right', out)
 
-    elif (final_size[0] < sim_size[0]) | (final_size[1] < sim_size[1]) :
-        print("Error: wrong final dimension size chosen")
-        return
 
-    else:
-        offset = final_size[1] - sim_size[1]
-        for i in range(sim_size[0]):
-            for j in range(sim_size[1]):
-                if sim_array[i, j] == 0:
-                    plot_array[int(i + row_shift), offset + j, :] = [1, 1, 1]
-                elif sim_array[i, j] == 1:
-                    plot_array[int(i + row_shift), offset + j, :] = [1, 1, 0]
-                elif sim_array[i, j] == 2:
-                    plot_array[int(i + row_shift), offset + j, :] = [0, 0, 0]
-        return plot_array
\ No newline at end of file
+def plot_grow2D_left(sim_array, final_size, out = None):
+    """
+    This function will plot the sim_array into a matrix of size final_size. It will be plotted into the center of the rows, but the right column will be
+    on the right of the domain, so it's always growing on one side. It's basically the other-side alternate to the above function.
+    Then, just as normal plotting, it will color the output matrix in accordance with the simple_plotter function.
+    sim_array should be a 2D array, and final_size should be a tuple. The output will be a 3D RGB array.
+    """
+    return render_frame(sim_array, final_size, 'grow_left', out)
@@ -0,0 +1,173 @@
+"""
+This module holds the timing instrumentation for the pipeline, so a slow batch run can be pinned on a stage (importing, rendering, saving, ...).
+Each stage records its wall time, frame count, bytes read and written, and the peak memory of the process, tagged with its simulation and frame.
+When instrumentation is off, every stage is a shared do-nothing object, so leaving the calls in the pipeline costs next to nothing.
+"""
+
+import os
+import sys
+import csv
+import json
+import time
+import cProfile
+from contextlib import contextmanager
+
+try:
+    import resource  # Not on Windows, where peak memory just isn't recorded
+except ImportError:
+    resource = None
+
+
+FIELDS = ('stage', 'sim', 'frame', 'seconds', 'frames', 'bytes_read', 'bytes_written', 'peak_rss_mb', 'pid')
+
+
+def peak_rss_mb():
+    """This function returns the peak resident memory of this process so far, in MB (None where it can't be measured)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':  # macOS reports bytes, Linux reports kB
+        return peak / 1e6
+    return peak / 1e3
+
+
+class Stage:
+    """
+    This class times one run of a stage. Use it as a context manager (made by Recorder.stage),
+    and call add() inside it to count frames or bytes as they're handled.
+    """
+    enabled = True
+
+    def __init__(self, recorder, name, fields):
+        self.recorder = recorder
+        self.record = {'stage': name, 'sim': None, 'frame': None, 'frames': 0, 'bytes_read': 0, 'bytes_written': 0}
+        self.record.update(fields)
+
+    def add(self, **counts):
+        """This function adds to the counts (frames, bytes_read, bytes_written) of the stage"""
+        for key, value in counts.items():
+            self.record[key] = self.record.get(key, 0) + value
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.record['seconds'] = time.perf_counter() - self.start
+        self.record['peak_rss_mb'] = peak_rss_mb()
+        self.record['pid'] = os.getpid()
+        self.recorder.records.append(self.record)
+        return False
+
+
+class NullStage:
+    """This class stands in for a Stage when instrumentation is off, it does nothing at all"""
+    enabled = False
+
+    def add(self, **counts):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class Recorder:
+    """
+    This class collects the records of every stage run while it's active (see stage and run_task).
+    Records are plain dictionaries with the keys in FIELDS, so they can be sent back from worker processes and merged with extend().
+    """
+
+    def __init__(self, enabled = True):
+        self.enabled = enabled
+        self.records = []
+
+    def stage(self, name, **fields):
+        """This function starts timing a stage, fields (like sim and frame) are stored with its record"""
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name, fields)
+
+    def extend(self, records):
+        """This function adds records collected somewhere else, like in a worker process"""
+        if self.enabled:
+            self.records.extend(records)
+
+    def summary(self, by = ('stage',)):
+        """
+        This function totals the records grouped by the given fields, e.g. by = ('sim', 'stage') for every stage of every simulation.
+        Returns a list of dictionaries with the group fields, the number of calls, the totals, and the highest peak memory.
+        """
+        groups = {}
+        for record in self.records:
+            key = tuple(record.get(field) for field in by)
+            total = groups.setdefault(key, dict(zip(by, key), calls=0, seconds=0.0, frames=0, bytes_read=0, bytes_written=0, peak_rss_mb=None))
+            total['calls'] += 1
+            for field in ('seconds', 'frames', 'bytes_read', 'bytes_written'):
+                total[field] += record.get(field) or 0
+            if record.get('peak_rss_mb') is not None:
+                total['peak_rss_mb'] = max(total['peak_rss_mb'] or 0, record['peak_rss_mb'])
+        return list(groups.values())
+
+    def print_summary(self):
+        """This function prints the total time, frames and bytes of each stage"""
+        for total in self.summary():
+            rate = total['frames'] / total['seconds'] if total['seconds'] > 0 else 0
+            print("  %-12s %10.3f s %8d frames %9.1f frames/s %10.3f MB read %10.3f MB written" % (
+                total['stage'], total['seconds'], total['frames'], rate, total['bytes_read'] / 1e6, total['bytes_written'] / 1e6))
+
+    def save(self, filepath):
+        """This function saves every record to a .json file (with a per stage summary) or, for any other extension, a .csv file"""
+        if filepath.lower().endswith('.json'):
+            with open(filepath, 'w') as f:
+                json.dump({'summary': self.summary(), 'records': self.records}, f, indent = 1)
+        else:
+            with open(filepath, 'w', newline = '') as f:
+                writer = csv.DictWriter(f, fieldnames = FIELDS, extrasaction = 'ignore')
+                writer.writeheader()
+                writer.writerows(self.records)
+
+
+_active = Recorder(enabled = False)
+
+
+def stage(name, **fields):
+    """This function starts timing a stage on the active recorder (off unless run through run_task with instrument set)"""
+    return _active.stage(name, **fields)
+
+
+@contextmanager
+def profiled(filepath = None):
+    """This function runs the code inside it under cProfile and dumps the profile to filepath. With no filepath it does nothing"""
+    if filepath is None:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        profiler.dump_stats(filepath)
+
+
+def run_task(func, args, instrument = False, profile_path = None):
+    """
+    This function runs func(*args) with a fresh active recorder, optionally under cProfile (see profiled).
+    It is how batch hands work to worker processes: returns (what func returns, the list of records made while it ran).
+    """
+    global _active
+    previous = _active
+    _active = Recorder(instrument)
+    try:
+        with profiled(profile_path):
+            result = func(*args)
+        return result, _active.records
+    finally:
+        _active = previous
@@ -0,0 +1,201 @@
+"""
+This module holds the render cache: results of rendering and encoding frames, looked up by a hash of the frame's cells and every setting that goes into them.
+Sweeps are full of frames that are exactly alike (the empty first frames of every run, runs that settled into the same pattern),
+so with the cache each of them is only shrunk or encoded into a .png once, and every other copy is just written out again.
+
+It has two tiers:
+    memory: the most recently used results of this process, up to a number of MB (least recently used are dropped first)
+    disk: an optional folder shared by every process and every run, up to a number of MB (the files least recently used are deleted first)
+Results are plain bytes (an encoded .png) or arrays (a shrunk frame), saved on disk as .npy. Every file is written to a temporary name
+and moved into place, so workers sharing the folder never read half of one, and a file deleted by another process is just a miss.
+"""
+
+import io
+import os
+import json
+import hashlib
+import collections
+import numpy as np
+
+
+MEMORY_MB = 64  # Default size of the memory tier of each process
+DISK_MB = 1024  # Default size of the disk tier
+LOW_WATER = 0.9  # Eviction clears the disk tier down to this fraction of its size, so it isn't run on every write
+
+
+def frame_key(kind, arrays, **settings):
+    """
+    This function gives the key of a result: the sha1 of kind (what sort of result it is, like 'png'), the dtype, shape and contents
+    of every array it's made from, and the settings (anything JSON can hold). Equal frames rendered the same way always get the same key.
+    """
+    digest = hashlib.sha1(kind.encode())
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(('%s%s' % (array.dtype.str, array.shape)).encode())
+        digest.update(array.reshape(-1).view(np.uint8))
+    digest.update(json.dumps(settings, sort_keys = True, default = str).encode())
+    return digest.hexdigest()
+
+
+def result_size(value):
+    """This function gives the number of bytes a cached result takes in memory"""
+    return value.nbytes if isinstance(value, np.ndarray) else len(value)
+
+
+class RenderCache:
+    """
+    This class is the two-tier cache (see the top of this module). memory_mb = 0 turns the memory tier off, and disk_dir = None the disk tier.
+    Arrays are kept read-only, since the same one is handed out to every caller that asks for it.
+    hits and misses count the lookups of each tier, to see how much the cache is saving.
+    """
+
+    def __init__(self, memory_mb = MEMORY_MB, disk_dir = None, disk_mb = DISK_MB):
+        self.memory_bytes = int(memory_mb * 1e6)
+        self.disk_dir = None if disk_dir is None else os.path.expanduser(disk_dir)
+        self.disk_bytes = int(disk_mb * 1e6)
+        self.memory = collections.OrderedDict()  # key -> result, least recently used first
+        self.memory_used = 0
+        self.disk_used = None  # Worked out the first time something is written
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return (self.memory_bytes > 0) or (self.disk_dir is not None)
+
+    def get(self, key):
+        """This function returns the result saved under key, or None if neither tier has it"""
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory.move_to_end(key)
+            self.hits['memory'] += 1
+            return value
+        value = self.read_disk(key)
+        if value is not None:
+            self.hits['disk'] += 1
+            self.remember(key, value)
+            return value
+        self.misses += 1
+
+    def put(self, key, value):
+        """This function saves a result (bytes or an array) under key in both tiers, and returns what's kept"""
+        if isinstance(value, np.ndarray):
+            value = value.copy()
+            value.flags.writeable = False
+        self.remember(key, value)
+        self.write_disk(key, value)
+        return value
+
+    def remember(self, key, value):
+        """This function keeps a result in the memory tier, dropping the least recently used ones to make room"""
+        size = result_size(value)
+        if size > self.memory_bytes:
+            return
+        if key in self.memory:
+            self.memory_used -= result_size(self.memory.pop(key))
+        self.memory[key] = value
+        self.memory_used += size
+        while self.memory_used > self.memory_bytes:
+            self.memory_used -= result_size(self.memory.popitem(last = False)[1])
+
+    def disk_path(self, key, suffix):
+        """This function gives the file of a result in the disk tier, in one of 256 subfolders so no folder gets too big"""
+        return os.path.join(self.disk_dir, key[:2], key + suffix)
+
+    def read_disk(self, key):
+        """This function reads a result from the disk tier (marking it as just used), or returns None if it isn't there"""
+        if self.disk_dir is None:
+            return
+        for suffix in ('.bin', '.npy'):
+            path = self.disk_path(key, suffix)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:  # Not cached, or evicted by another process in the meantime
+                continue
+            if suffix == '.bin':
+                return data
+            value = np.load(io.BytesIO(data))
+            value.flags.writeable = False
+            return value
+
+    def write_disk(self, key, value):
+        """This function saves a result to the disk tier, evicting old files if that takes it over its size"""
+        if self.disk_dir is None:
+            return
+        if isinstance(value, np.ndarray):
+            buffer = io.BytesIO()
+            np.save(buffer, value)
+            data = buffer.getvalue()
+            path = self.disk_path(key, '.npy')
+        else:
+            data = bytes(value)
+            path = self.disk_path(key, '.bin')
+        if len(data) > self.disk_bytes:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        if self.disk_used is None:
+            self.disk_used = sum(size for _, size, _ in self.disk_files())
+        else:
+            self.disk_used += len(data)
+        if self.disk_used > self.disk_bytes:
+            self.evict()
+
+    def disk_files(self):
+        """This function lists the files of the disk tier as (last used time, size, path)"""
+        files = []
+        if (self.disk_dir is None) or not os.path.isdir(self.disk_dir):
+            return files
+        for folder in os.scandir(self.disk_dir):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def evict(self):
+        """
+        This function deletes the least recently used files of the disk tier until it's down to LOW_WATER of its size.
+        The folder is listed again first, since other processes write to it too.
+        """
+        files = sorted(self.disk_files())
+        self.disk_used = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if self.disk_used <= self.disk_bytes * LOW_WATER:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.disk_used -= size
+
+    def clear(self):
+        """This function empties the memory tier (the disk tier is left alone)"""
+        self.memory.clear()
+        self.memory_used = 0
+
+
+CACHE = RenderCache()  # The cache the plotters and exporters use, memory only unless use_cache is given a folder
+
+
+def use_cache(disk_dir = None, disk_mb = DISK_MB, memory_mb = MEMORY_MB):
+    """
+    This function sets up the cache the plotters and exporters use (see RenderCache), and returns it.
+    The current one is kept if it's already set up that way, so calling this at the start of every task keeps the memory tier between tasks.
+    """
+    global CACHE
+    disk_dir = None if disk_dir is None else os.path.expanduser(disk_dir)
+    if (CACHE.disk_dir, CACHE.disk_bytes, CACHE.memory_bytes) != (disk_dir, int(disk_mb * 1e6), int(memory_mb * 1e6)):
+        CACHE = RenderCache(memory_mb, disk_dir, disk_mb)
+    return CACHE
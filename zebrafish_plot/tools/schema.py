@@ -0,0 +1,105 @@
+"""
+This module holds the cell-state schema: which codes the simulations write into their .csv files, what each cell type is called,
+and the color it's drawn in. The schema is compiled into a lookup table from cell code to palette index, so turning a frame into colors
+is one table lookup however many cell types there are, and every renderer, the space-time plots and the image writers share the same palette.
+
+The built-in schema is the S/X/M model of the Differential Growth simulations. Other models (like ones with iridophores) can load their own
+from a .json file of the form:
+    {"cell_types": [{"code": 0, "name": "S", "label": "empty cell", "color": [1, 1, 1]},
+                    {"code": 1, "name": "X", "label": "xanthophore", "color": "#ffff00", "stripes": true},
+                    ...],
+     "background": [0, 0, 1]}
+Colors are 0-1 RGB lists or '#rrggbb' strings. background is the color of space outside of the domain (and of any unknown code).
+Cell types with "stripes" set are the ones whose runs are counted as stripes by the pattern statistics.
+"""
+
+import json
+import numpy as np
+
+
+DEFAULT_CONFIG = {
+    'cell_types': [{'code': 0, 'name': 'S', 'label': 'empty cell', 'color': [1, 1, 1], 'stripes': False},   # white
+                   {'code': 1, 'name': 'X', 'label': 'xanthophore', 'color': [1, 1, 0], 'stripes': True},  # yellow
+                   {'code': 2, 'name': 'M', 'label': 'melanophore', 'color': [0, 0, 0], 'stripes': True}], # black
+    'background': [0, 0, 1],  # blue
+}
+EMPTY_CODE = 10  # Marks blank space: outside of each frame in the frame stack, blank cells in frame packs, and no cell in space-time plots
+RESERVED_CODES = (EMPTY_CODE,)  # Codes a schema can't use, so they're always background
+
+
+def parse_color(color):
+    """This function reads a color written as a 0-1 RGB list or a '#rrggbb' string into an array of 3 floats"""
+    if isinstance(color, str):
+        text = color.lstrip('#')
+        if len(text) != 6:
+            raise ValueError("colors should look like '#ffff00', not " + color)
+        return np.array([int(text[k:k + 2], 16) / 255 for k in (0, 2, 4)])
+    rgb = np.asarray(color, dtype=float)
+    if (rgb.shape != (3,)) or (rgb.min() < 0) or (rgb.max() > 1):
+        raise ValueError("colors should be 3 values from 0 to 1, not " + str(color))
+    return rgb
+
+
+class CellSchema:
+    """
+    This class compiles a schema config (see DEFAULT_CONFIG) into what the renderers need:
+        palette and palette_rgb8: the color of every cell type in order, then the background color, as 0-1 floats and as 8-bit values
+        background: the palette index of the background (the number of cell types)
+        names, codes and stripes: the name and code of every cell type in palette order, and the names of the striped ones
+    Codes have to fit in an int8 (that's how frames are cached and packed) and can't be one of RESERVED_CODES.
+    """
+
+    def __init__(self, config = None):
+        if config is None:
+            config = DEFAULT_CONFIG
+        self.config = json.loads(json.dumps(config))  # A plain copy, so it can go into the manifest and be compared
+        cell_types = self.config['cell_types']
+        self.codes = [int(cell['code']) for cell in cell_types]
+        self.names = [str(cell['name']) for cell in cell_types]
+        self.stripes = [str(cell['name']) for cell in cell_types if cell.get('stripes', False)]
+        if (len(set(self.codes)) != len(self.codes)) or (len(set(self.names)) != len(self.names)):
+            raise ValueError("cell type codes and names have to be unique")
+        if len(cell_types) > 250:
+            raise ValueError("too many cell types to fit in a palette")
+        for code in self.codes:
+            if not (-128 <= code <= 127) or (code in RESERVED_CODES):
+                raise ValueError("cell code %d is reserved or doesn't fit in an int8" % code)
+
+        self.background = len(cell_types)
+        colors = [parse_color(cell['color']) for cell in cell_types] + [parse_color(self.config.get('background', DEFAULT_CONFIG['background']))]
+        self.palette = np.array(colors, dtype=float)
+        self.palette_rgb8 = np.round(self.palette * 255).astype(np.uint8)
+
+        self.lut = np.full(256, self.background, dtype=np.uint8)  # Palette index of every int8 code, indexed by the code's byte
+        for k, code in enumerate(self.codes):
+            self.lut[code & 0xFF] = k
+        self.lut_uint8 = np.full(256, self.background, dtype=np.uint8)  # The same for uint8 frames, where bytes over 127 aren't negative codes
+        self.lut_uint8[:128] = self.lut[:128]
+
+    def indices(self, codes, out = None):
+        """
+        This function turns an array of cell codes into palette indices with one lookup into the compiled table.
+        Anything that isn't a known cell code (including NaN or fractional values) is sent to the background.
+        Pass a uint8 array (or view) of the same shape as out to write the indices straight into it.
+        """
+        codes = np.asarray(codes)
+        if codes.dtype == np.int8:
+            return np.asarray(np.take(self.lut, codes.view(np.uint8), out=out, mode='clip'))  # (asarray keeps 0D frames arrays)
+        if codes.dtype in (np.uint8, np.bool_):
+            return np.asarray(np.take(self.lut_uint8, codes.view(np.uint8), out=out, mode='clip'))
+        if codes.dtype.kind in 'iu':
+            wide = codes.astype(np.int64)
+            outside = (wide < -128) | (wide > 127)
+        else:
+            with np.errstate(invalid='ignore'):  # NaN and huge values can't be cast, they're caught by outside just below
+                wide = codes.astype(np.int64)
+            outside = (wide != codes) | (wide < -128) | (wide > 127)  # NaN is never equal, and fractions don't survive the cast
+        result = np.asarray(np.take(self.lut, wide & 0xFF, out=out, mode='clip'))
+        result[outside] = self.background
+        return result
+
+
+def load_schema(filepath):
+    """This function reads a schema config from a .json file (see the top of this module) and compiles it"""
+    with open(filepath) as f:
+        return CellSchema(json.load(f))
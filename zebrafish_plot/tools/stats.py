@@ -0,0 +1,166 @@
+"""
+This module holds the pattern statistics of simulations: numbers about every frame instead of pictures of it.
+For each frame it counts the cells of every type in the cell-state schema (S, X and M by default, see schema.py), measures the size of the domain,
+and counts the stripes (runs of the striped cell types, X and M by default) along any number of cuts, with their widths.
+
+Statistics are collected one frame at a time with PatternStats, so they can be worked out in the same pass over the frames as the images,
+and are saved as one compact columnar table per simulation (a .npz of one array per column), so nothing needs to read the .csv files again.
+"""
+
+import os
+import numpy as np
+
+from . import importers, plotters, STPlotter
+
+
+STATS_NAME = 'stats.npz'  # What batch calls the table inside a simulation's Images folder
+
+
+def cell_counts(sim_array):
+    """
+    This function counts the cells of every cell type of the schema in a frame, returned as an array in the schema's order
+    (blank or unknown cells aren't counted). All types are counted in one bincount.
+    """
+    counts = np.bincount(plotters.color_codes(sim_array).ravel(), minlength=len(plotters.PALETTE))
+    return counts[:plotters.BACKGROUND].astype(np.int64)
+
+
+def cut_line(sim_array, cut):
+    """
+    This function gives the cells of a frame along a (direction, index) cut (see STPlotter.parse_cut), as palette indices.
+    Cuts are taken in the frame itself, so no index means the middle row (or column) of that frame, whatever its size.
+    Returns None if the cut is outside of the frame.
+    """
+    block = plotters.color_codes(plotters.as_2D(np.asarray(sim_array)))
+    direction, index = cut
+    length = block.shape[0] if direction == 'row' else block.shape[1]
+    if index is None:
+        index = (length - 1) // 2
+    if not (0 <= index < length):
+        return
+    return block[index, :] if direction == 'row' else block[:, index]
+
+
+def run_lengths(line):
+    """This function splits a line of cells into runs of the same cell, returned as (the cell of each run, the length of each run)"""
+    line = np.asarray(line)
+    if line.size == 0:
+        return line, np.zeros(0, dtype=np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(line[1:] != line[:-1]) + 1))
+    return line[starts], np.diff(np.append(starts, line.size))
+
+
+def stripe_widths(line, index, min_width = 1):
+    """This function gives the widths of the stripes (runs of cells equal to a palette index, at least min_width long) along a line of cells"""
+    cells, lengths = run_lengths(line)
+    widths = lengths[cells == index]
+    return widths[widths >= min_width]
+
+
+class PatternStats:
+    """
+    This class collects the statistics of a simulation one frame at a time (see add), and turns them into a columnar table.
+
+    Every frame gets its name, its number of rows and columns (1D frames are one column, 0D frames a single cell), the count and fraction
+    of each cell type of the schema, and for each cut the number of stripes of each striped cell type along it with their mean width.
+    The width of every stripe is also kept, as one flat array per cut and cell type plus an array of where each frame's widths start,
+    so the table stays a set of plain arrays. Runs shorter than min_width cells (like single noisy cells) aren't counted as stripes.
+    """
+
+    def __init__(self, cuts = (('col', None),), min_width = 1):
+        self.cuts = list(cuts)
+        self.min_width = min_width
+        self.cell_types = list(plotters.SCHEMA.names)
+        self.stripe_types = [(name, self.cell_types.index(name)) for name in plotters.SCHEMA.stripes]  # (name, palette index)
+        self.names = []
+        self.sizes = []
+        self.counts = []
+        self.stripes = {self.stripe_key(cut, kind): ([], []) for cut in self.cuts for kind, _ in self.stripe_types}  # (stripes per frame, widths per frame)
+
+    @staticmethod
+    def stripe_key(cut, kind):
+        """This function gives the start of the column names of a cut and stripe type, like 'col_mid_M' or 'row_12_X'"""
+        direction, index = cut
+        return '%s_%s_%s' % (direction, 'mid' if index is None else index, kind)
+
+    def add(self, name, sim_array):
+        """This function adds the statistics of the next frame"""
+        sim_array = np.asarray(sim_array)
+        self.names.append(name)
+        self.sizes.append(importers.frame_extent(sim_array))
+        self.counts.append(cell_counts(sim_array))
+        for cut in self.cuts:
+            line = cut_line(sim_array, cut)
+            for kind, index in self.stripe_types:
+                widths = np.zeros(0, dtype=np.int64) if line is None else stripe_widths(line, index, self.min_width)
+                n_stripes, all_widths = self.stripes[self.stripe_key(cut, kind)]
+                n_stripes.append(-1 if line is None else len(widths))  # -1 marks a cut that's outside of the frame
+                all_widths.append(widths)
+
+    def resume(self, table):
+        """This function starts the statistics off from a table of the first frames made earlier with the same cuts and min_width (see table)"""
+        for k, name in enumerate(table['frame']):
+            self.names.append(str(name))
+            self.sizes.append((int(table['rows'][k]), int(table['cols'][k])))
+            self.counts.append([int(table['count_' + kind][k]) for kind in self.cell_types])
+            for key, (n_stripes, all_widths) in self.stripes.items():
+                n_stripes.append(int(table[key + '_stripes'][k]))
+                all_widths.append(frame_widths(table, key, k))
+
+    def __len__(self):
+        return len(self.names)
+
+    def table(self):
+        """This function returns the statistics as a dictionary of column name -> array, one row per frame added"""
+        n = len(self.names)
+        sizes = np.array(self.sizes, dtype=np.int64).reshape(n, 2)
+        counts = np.array(self.counts, dtype=np.int64).reshape(n, len(self.cell_types))
+        total = counts.sum(axis=1)
+        table = {'frame': np.array(self.names, dtype=str), 'rows': sizes[:, 0], 'cols': sizes[:, 1], 'cells': total}
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for k, kind in enumerate(self.cell_types):
+                table['count_' + kind] = counts[:, k]
+                table['frac_' + kind] = counts[:, k] / total
+            for key, (n_stripes, all_widths) in self.stripes.items():
+                widths_sum = np.array([widths.sum() for widths in all_widths], dtype=np.float64)
+                table[key + '_stripes'] = np.array(n_stripes, dtype=np.int64)
+                table[key + '_mean_width'] = widths_sum / np.array([len(widths) for widths in all_widths])
+                table[key + '_widths'] = np.concatenate(all_widths) if all_widths else np.zeros(0, dtype=np.int64)
+                table[key + '_widths_start'] = np.cumsum([0] + [len(widths) for widths in all_widths])[:-1]
+        return table
+
+    def save(self, filepath):
+        """This function saves the table to a compressed .npz file (read it back with load_stats)"""
+        save_stats(filepath, self.table())
+
+
+def save_stats(filepath, table):
+    """This function saves a table of statistics to a compressed .npz file, written to a temporary file first so it's never seen half written"""
+    with open(filepath + '.tmp', 'wb') as f:
+        np.savez_compressed(f, **table)
+    os.replace(filepath + '.tmp', filepath)
+
+
+def load_stats(filepath):
+    """This function reads a table saved by save_stats back into a dictionary of column name -> array"""
+    with np.load(filepath) as data:
+        return {key: data[key] for key in data.files}
+
+
+def frame_widths(table, key, k):
+    """This function gives the stripe widths of frame k from a table, for a key made by PatternStats.stripe_key (like 'col_mid_M')"""
+    starts = table[key + '_widths_start']
+    stop = starts[k + 1] if k + 1 < len(starts) else len(table[key + '_widths'])
+    return table[key + '_widths'][starts[k]:stop]
+
+
+def simulation_stats(simpath, cuts = (('col', None),), min_width = 1):
+    """
+    This function works out the statistics of every frame of a simulation on its own, without making any images.
+    cuts can be (direction, index) tuples or strings like 'col' or 'row:12' (see STPlotter.parse_cut). Returns the table.
+    """
+    cuts = [STPlotter.parse_cut(cut) if isinstance(cut, str) else cut for cut in cuts]
+    stats = PatternStats([cut for cut in cuts if cut is not None], min_width)
+    for name, sim_array in importers.SimulationReader(simpath).items():
+        stats.add(name, sim_array)
+    return stats.table()
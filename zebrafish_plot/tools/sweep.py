@@ -0,0 +1,186 @@
+"""
+This module holds the functions that look at a whole parameter sweep at once, instead of one simulation at a time.
+The parameters of each simulation are read from its folder name (like 'width_4_noise_0.1'), and the final frame (or a space-time plot)
+of every simulation is drawn into one montage image, laid out on a grid with one parameter along the rows and another along the columns.
+Tiles are made straight from the frames (out of the frame cache when it's there), or from the space-time plots batch keeps, and shrunk to a small size,
+so no per-frame images are needed.
+"""
+
+import os
+import re
+import json
+import math
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from . import importers, plotters, exporters, STPlotter, batch
+
+
+PARAMETER = re.compile(r'([A-Za-z][A-Za-z0-9]*)[_=]([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)(?=_|$)')
+SOURCES = ('final', 'space_time')
+
+
+def parse_parameters(name):
+    """
+    This function reads the parameters out of a simulation folder name written as name_value pairs (or name=value),
+    like 'width_4_noise_0.1' -> {'width': 4, 'noise': 0.1}. Values are kept as ints when they're whole numbers.
+    """
+    name = os.path.basename(os.path.normpath(name))
+    parameters = {}
+    for key, value in PARAMETER.findall(name):
+        number = float(value)
+        parameters[key] = int(number) if re.fullmatch(r'[-+]?\d+', value) else number
+    return parameters
+
+
+def sweep_layout(sims, row_param = None, col_param = None):
+    """
+    This function places every simulation on a grid by its parameters. By default the first parameter in the folder names goes along the rows
+    and the second along the columns, with each axis sorted by value. Any other parameters are added to the rows, so every simulation gets its own tile.
+    Without parameters (or if asked for one that isn't in the names) the simulations just fill a square-ish grid in order.
+    Returns (row labels, column labels, {sim: (row, col)}), where labels are dictionaries of the parameters of that row or column.
+    """
+    parameters = {sim: parse_parameters(sim) for sim in sims}
+    keys = []
+    for values in parameters.values():
+        keys.extend(key for key in values if key not in keys)
+    if (row_param is None) and (len(keys) > 0):
+        row_param = keys[0]
+    if (col_param is None) and (len(keys) > 1):
+        col_param = [key for key in keys if key != row_param][0]
+
+    if (row_param not in keys) or ((col_param is not None) and (col_param not in keys)):
+        if row_param is not None:
+            print("Error: not every simulation name has the parameters " + str(row_param) + ", " + str(col_param) + ", laying them out in order")
+        n_cols = int(math.ceil(math.sqrt(len(sims))))
+        positions = {sim: (k // n_cols, k % n_cols) for k, sim in enumerate(sims)}
+        n_rows = int(math.ceil(len(sims) / n_cols)) if n_cols > 0 else 0
+        return [{} for _ in range(n_rows)], [{} for _ in range(n_cols)], positions
+
+    row_keys = [row_param] + [key for key in keys if key not in (row_param, col_param)]
+    col_keys = [] if col_param is None else [col_param]
+
+    def label(sim, label_keys):
+        return tuple(parameters[sim].get(key) for key in label_keys)
+
+    def order(value):
+        return tuple((item is None, item if item is not None else 0) for item in value)
+
+    row_values = sorted(set(label(sim, row_keys) for sim in sims), key=order)
+    col_values = sorted(set(label(sim, col_keys) for sim in sims), key=order)
+    positions = {sim: (row_values.index(label(sim, row_keys)), col_values.index(label(sim, col_keys))) for sim in sims}
+    return ([dict(zip(row_keys, value)) for value in row_values], [dict(zip(col_keys, value)) for value in col_values], positions)
+
+
+def final_frame_tile(sim, tile_size, placement = 'grow_right'):
+    """This function renders the last frame of a simulation into palette indices, shrunk to fit inside tile_size"""
+    img_list = importers.simulation_frames(sim)
+    if len(img_list) == 0:
+        return
+    final_img = importers.read_frame(sim, img_list[-1])
+    final_size = importers.frame_extent(final_img)
+    return plotters.render_downsampled(final_img, final_size, placement, target_size=tile_size)
+
+
+def space_time_tile(sim, tile_size, cut = ('row', None), placement = 'grow_right'):
+    """
+    This function gives a space-time plot of a simulation along a (direction, index) cut, shrunk to fit inside tile_size.
+    The plot kept by the last batch run is used if it covers every frame (see batch.saved_space_time), otherwise it's built from the frames.
+    """
+    img_list = importers.simulation_frames(sim)
+    if len(img_list) == 0:
+        return
+    final_size = importers.frame_extent(importers.read_frame(sim, img_list[-1]))
+    STarray = batch.saved_space_time(sim, cut, final_size, placement)
+    if STarray is None:
+        builder = STPlotter.SpaceTimeBuilder(final_size, [cut], placement, len(img_list))
+        if len(builder.cuts) == 0:
+            return
+        for sim_array in importers.SimulationReader(sim, img_list):
+            builder.add(sim_array)
+        STarray = builder.result()[0]
+    return plotters.render_downsampled(STarray, STarray.shape, 'to_size', target_size=tile_size)
+
+
+def make_tile(sim, tile_size, source = 'final', cut = ('row', None), placement = 'grow_right', cell_types = None):
+    """
+    This function makes the tile of one simulation for a montage (see SOURCES), drawn with the cell-state schema config cell_types.
+    It is what the worker processes run.
+    """
+    plotters.use_schema(cell_types)
+    if source == 'space_time':
+        return space_time_tile(sim, tile_size, cut, placement)
+    return final_frame_tile(sim, tile_size, placement)
+
+
+def compose_montage(tiles, positions, n_rows, n_cols, gap = 2):
+    """
+    This function lays palette-indexed tiles out on an n_rows x n_cols grid, each centered in a cell as big as the biggest tile,
+    with gap pixels between cells. Anything not covered by a tile is background. Returns the montage as palette indices.
+    """
+    tiles = {sim: tile for sim, tile in tiles.items() if tile is not None}
+    cell_rows = max([tile.shape[0] for tile in tiles.values()] + [1])
+    cell_cols = max([tile.shape[1] for tile in tiles.values()] + [1])
+    montage = np.full((n_rows * (cell_rows + gap) + gap, n_cols * (cell_cols + gap) + gap), plotters.BACKGROUND, dtype=np.uint8)
+    for sim, tile in tiles.items():
+        row, col = positions[sim]
+        top = gap + row * (cell_rows + gap) + (cell_rows - tile.shape[0]) // 2
+        left = gap + col * (cell_cols + gap) + (cell_cols - tile.shape[1]) // 2
+        montage[top:top + tile.shape[0], left:left + tile.shape[1]] = tile
+    return montage, (cell_rows, cell_cols)
+
+
+def save_labelled_montage(filepath, montage, cell_size, row_labels, col_labels, gap = 2):
+    """This function saves a montage through a matplotlib figure, with the parameters of each row and column written along the axes"""
+    import matplotlib.pyplot as plt  # Only imported when it's needed, it's slow to import
+    height, width = montage.shape
+    fig, ax = plt.subplots(figsize=(max(4, width / 100 + 2), max(3, height / 100 + 1.5)))
+    ax.imshow(plotters.indexed_to_rgb(montage), interpolation='nearest')
+    ax.set_yticks([gap + k * (cell_size[0] + gap) + cell_size[0] / 2 for k in range(len(row_labels))])
+    ax.set_yticklabels([', '.join('%s=%s' % item for item in label.items()) for label in row_labels])
+    ax.set_xticks([gap + k * (cell_size[1] + gap) + cell_size[1] / 2 for k in range(len(col_labels))])
+    ax.set_xticklabels([', '.join('%s=%s' % item for item in label.items()) for label in col_labels], rotation=45, ha='right')
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+    ax.tick_params(length=0)
+    fig.savefig(filepath, bbox_inches='tight')
+    plt.close(fig)
+
+
+def make_montage(sims, filepath, tile_size = (100, 400), source = 'final', cut = ('row', None), placement = 'grow_right',
+                 row_param = None, col_param = None, gap = 2, styled = False, workers = None, cell_types = None):
+    """
+    This function makes a montage of a whole sweep: one tile per simulation (its final frame or a space-time plot along cut, see SOURCES),
+    shrunk to fit inside tile_size and laid out on a grid by the parameters in the folder names (see sweep_layout).
+    Tiles are made on a pool of workers processes (1 makes them all in this process), drawn with the cell-state schema config cell_types.
+    The montage is saved to filepath as a .png (with parameter labels if styled), and the layout next to it as a .json of
+    the row and column parameters and where each simulation went. Returns the montage as palette indices.
+    """
+    if source not in SOURCES:
+        print("Error: unknown montage source " + str(source))
+        return
+    row_labels, col_labels, positions = sweep_layout(sims, row_param, col_param)
+    pool = batch.InlinePool() if workers == 1 else ProcessPoolExecutor(max_workers=workers)
+    with pool:
+        futures = {sim: pool.submit(make_tile, sim, tuple(tile_size), source, cut, placement, cell_types) for sim in sims}
+        tiles = {}
+        for sim, future in futures.items():
+            try:
+                tiles[sim] = future.result()
+            except Exception as err:  # One bad simulation just leaves its cell empty
+                tiles[sim] = None
+                print("Error: could not make a tile of " + sim + " (%s: %s)" % (type(err).__name__, ' '.join(str(err).split())))
+                continue
+            if tiles[sim] is None:
+                print("Error: could not make a tile of " + sim)
+    plotters.use_schema(cell_types)
+
+    montage, cell_size = compose_montage(tiles, positions, len(row_labels), len(col_labels), gap)
+    if styled:
+        save_labelled_montage(filepath, montage, cell_size, row_labels, col_labels, gap)
+    else:
+        exporters.write_png(filepath, montage)
+    with open(os.path.splitext(filepath)[0] + '.json', 'w') as f:
+        json.dump({'source': source, 'rows': row_labels, 'cols': col_labels, 'cell_size': list(cell_size), 'gap': gap,
+                   'sims': {sim: list(position) for sim, position in positions.items()}}, f, indent = 1)
+    return montage
@@ -0,0 +1,90 @@
+"""
+This module makes fake simulation output that looks like what MC_Simulation writes, for benchmarking and trying things out without real runs.
+Each simulation is a folder of img_xxxx.csv files of a domain that starts as a single cell, grows into a column, and then widens into stripes.
+"""
+
+import os
+import numpy as np
+
+
+def make_frame(rows, cols, stripe_width = 4, noise = 0.1, rng = None):
+    """
+    This function makes one frame of cell codes: horizontal stripes of xanthophores (1) and melanophores (2),
+    with a fraction noise of the cells randomly replaced by any cell type (including empty cells, 0).
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    stripes = np.where((np.arange(rows) // stripe_width) % 2 == 0, 1, 2).astype(np.int8)
+    frame = np.repeat(stripes[:, np.newaxis], cols, axis=1)
+    flips = rng.random((rows, cols)) < noise
+    frame[flips] = rng.integers(0, 3, size=int(flips.sum()))
+    return frame
+
+
+def write_frame_csv(filepath, frame):
+    """This function writes a frame the way MC_Simulation does: comma separated integers, one row per line (a 1D frame is one value per line)"""
+    frame = np.asarray(frame)
+    if frame.ndim == 0:
+        with open(filepath, 'w') as f:
+            f.write('%d\n' % frame)
+    elif frame.ndim == 1:
+        np.savetxt(filepath, frame, fmt='%d')
+    else:
+        np.savetxt(filepath, frame, fmt='%d', delimiter=',')
+
+
+def frame_sizes(final_size, n_frames):
+    """
+    This function gives the size of every frame of a growing domain ending at final_size.
+    The first frame is a single cell (0D) and the second a single column (1D). The rows fill in over the first tenth of the run
+    and the columns grow over the whole run, like a domain growing along its length.
+    """
+    sizes = []
+    row_frames = max(n_frames // 10, 2)
+    for k in range(n_frames):
+        if k == 0:
+            sizes.append(())
+            continue
+        rows = int(min(final_size[0], max(2, round(final_size[0] * k / row_frames))))
+        cols = int(max(1, round(final_size[1] * (k + 1) / n_frames)))
+        if (k == 1) or (cols == 1):
+            sizes.append((rows,))
+        else:
+            sizes.append((rows, cols))
+    sizes[-1] = tuple(final_size)
+    return sizes
+
+
+def make_simulation(simpath, final_size = (100, 400), n_frames = 200, stripe_width = 4, noise = 0.1, seed = 0):
+    """
+    This function fills the folder simpath with n_frames img_xxxx.csv files of a growing striped domain ending at final_size.
+    The same seed always makes the same simulation. Returns the list of file names written.
+    """
+    rng = np.random.default_rng(seed)
+    os.makedirs(simpath, exist_ok=True)
+    names = []
+    for k, size in enumerate(frame_sizes(final_size, n_frames)):
+        if len(size) == 0:
+            frame = np.array(rng.integers(0, 3), dtype=np.int8)
+        elif len(size) == 1:
+            frame = make_frame(size[0], 1, stripe_width, noise, rng)[:, 0]
+        else:
+            frame = make_frame(size[0], size[1], stripe_width, noise, rng)
+        name = 'img_%04d.csv' % k
+        write_frame_csv(os.path.join(simpath, name), frame)
+        names.append(name)
+    return names
+
+
+def make_sweep(sweeppath, stripe_widths = (2, 4, 8), noises = (0.05, 0.1, 0.2), final_size = (50, 200), n_frames = 50, seed = 0):
+    """
+    This function makes a parameter sweep: one simulation folder per combination of stripe width and noise,
+    named like the sweeps we run ('width_4_noise_0.1'). Returns the list of simulation folders.
+    """
+    sims = []
+    for i, width in enumerate(stripe_widths):
+        for j, noise in enumerate(noises):
+            simpath = os.path.join(sweeppath, 'width_%g_noise_%g' % (width, noise))
+            make_simulation(simpath, final_size, n_frames, width, noise, seed + i * len(noises) + j)
+            sims.append(simpath)
+    return sims
@@ -0,0 +1,168 @@
+"""
+This module follows simulations that are still running, rendering their frames as MC_Simulation writes them.
+Each round only the simulations whose folders changed are passed to batch.run_batch, which renders just the new frames (see the manifest)
+and makes the animation and space-time plots again, so they always show the run so far. The space-time plots and statistics
+carry on from the last round (see batch.resume_finish_state), so only the new frames are read for them.
+
+Between rounds it sleeps until a folder changes. With the inotify_simple package (Linux) that's a blocking wait on the kernel,
+otherwise the folders are checked every few seconds, which only looks at their modification times (see SimulationFinder). Either way it uses next to no CPU while idle.
+Frames that may still be being written are left for the next round (see importers.settled_frames).
+"""
+
+import os
+import glob
+import time
+
+from . import batch, importers, framepack
+
+try:
+    import inotify_simple  # Optional, without it folders are polled
+except ImportError:
+    inotify_simple = None
+
+
+def folder_signature(sim):
+    """
+    This function gives a cheap fingerprint of a simulation folder: the modification time of the folder (which changes whenever a file
+    is added, removed or renamed in it) and of its frame pack. A new frame changes it, without listing or reading any of the files.
+    """
+    try:
+        stat = os.stat(sim)
+    except OSError:
+        return
+    pack = framepack.pack_path(sim)
+    pack_stat = os.stat(pack) if os.path.isfile(pack) else None
+    return (stat.st_mtime_ns, None if pack_stat is None else (pack_stat.st_size, pack_stat.st_mtime_ns))
+
+
+def folder_mtime(folder):
+    """This function gives the modification time of a folder, or None if it's gone"""
+    try:
+        return os.stat(folder).st_mtime_ns
+    except OSError:
+        return
+
+
+class SimulationFinder:
+    """
+    This class keeps the list of simulations under the watched paths (see batch.find_simulations) without listing every folder every round.
+    A root folder is only searched again when its modification time changed (a folder was added or removed in it), or when one of its
+    subfolders that wasn't a simulation yet changed (a simulation that just started writing frames). A root that is a simulation itself stays one.
+    """
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.roots = {}  # root -> (its mtime, its simulations, {subfolder: mtime} of the subfolders that aren't simulations yet)
+
+    def scan(self, root):
+        """This function searches a root folder, giving its simulations and the mtimes of the subfolders that aren't simulations yet"""
+        sims = batch.find_simulations([glob.escape(root)])
+        pending = {}
+        if os.path.join(os.path.abspath(root), '') not in sims:
+            for item in sorted(os.listdir(root)):
+                subpath = os.path.join(root, item)
+                if os.path.isdir(subpath) and (os.path.join(os.path.abspath(subpath), '') not in sims):
+                    pending[subpath] = folder_mtime(subpath)
+        return sims, pending
+
+    def find(self):
+        """This function gives the simulations under the watched paths, searching again only the roots that changed"""
+        sims = []
+        for pattern in self.paths:
+            for root in sorted(glob.glob(os.path.expanduser(pattern))):
+                if not os.path.isdir(root):
+                    continue
+                mtime = folder_mtime(root)
+                known = self.roots.get(root)
+                if ((known is None) or ((known[0] != mtime) and (os.path.join(os.path.abspath(root), '') not in known[1]))
+                        or any(folder_mtime(subpath) != subtime for subpath, subtime in known[2].items())):
+                    known = self.roots[root] = (mtime,) + self.scan(root)
+                sims.extend(sim for sim in known[1] if sim not in sims)
+        return sims
+
+    def folders(self):
+        """This function gives the folders new simulations can show up in: the roots and their subfolders that aren't simulations yet"""
+        return [folder for root, (_, _, pending) in self.roots.items() for folder in [root] + list(pending)]
+
+
+class PollingWaiter:
+    """This class waits between rounds by just sleeping, the folders are checked again after every sleep"""
+
+    def watch(self, folders):
+        pass
+
+    def wait(self, timeout):
+        time.sleep(timeout)
+
+
+class InotifyWaiter:
+    """This class waits between rounds until a watched folder gets a new, finished or moved file (or the timeout runs out), through inotify"""
+
+    def __init__(self):
+        self.inotify = inotify_simple.INotify()
+        self.flags = (inotify_simple.flags.CREATE | inotify_simple.flags.CLOSE_WRITE | inotify_simple.flags.MOVED_TO
+                      | inotify_simple.flags.DELETE)
+        self.watched = set()
+
+    def watch(self, folders):
+        """This function starts watching any of the folders that aren't watched yet"""
+        for folder in folders:
+            if folder not in self.watched:
+                try:
+                    self.inotify.add_watch(folder, self.flags)
+                    self.watched.add(folder)
+                except OSError:
+                    pass
+
+    def wait(self, timeout):
+        self.inotify.read(timeout = int(timeout * 1000), read_delay = 100)  # read_delay gathers the events of a burst of files into one round
+
+
+def make_waiter():
+    """This function gives an InotifyWaiter where inotify is available, or else a PollingWaiter"""
+    if inotify_simple is not None:
+        try:
+            return InotifyWaiter()
+        except OSError:
+            pass
+    return PollingWaiter()
+
+
+def watch(paths, workers = None, frames_per_task = 50, settings = batch.DEFAULT_SETTINGS, interval = 5.0, settle = 2.0, recorder = None):
+    """
+    This function follows the simulations in paths (see batch.find_simulations, new simulations that show up later are picked up too) until interrupted.
+    Every round renders the finished frames of the simulations whose folders changed since the last round, with batch.run_batch.
+    Frames held back because they may still be being written are checked again after settle seconds, otherwise the folders are checked
+    again when inotify says something changed or, when polling, every interval seconds.
+    settings should have a canvas_size, or every frame is rendered again each round the domain grows (see batch.plan_simulation).
+    """
+    waiter = make_waiter()
+    print("Watching for new frames (%s), press Ctrl+C to stop" % ('inotify' if isinstance(waiter, InotifyWaiter) else 'polling every %g s' % interval))
+    finder = SimulationFinder(paths)
+    signatures = {}
+    waiting = set()  # Simulations with frames held back last round
+    try:
+        while True:
+            sims = finder.find()
+            waiter.watch(finder.folders())
+            waiter.watch(sims)
+
+            changed = []
+            for sim in sims:
+                signature = folder_signature(sim)
+                if (signature != signatures.get(sim)) or (sim in waiting):
+                    changed.append(sim)
+                signatures[sim] = signature
+            if len(changed) > 0:
+                batch.run_batch(changed, workers = workers, frames_per_task = frames_per_task, settings = settings,
+                                recorder = recorder, settle = settle)
+                waiting = set(sim for sim in changed if held_back(sim, settle))
+            waiter.wait(settle if len(waiting) > 0 else interval)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+
+
+def held_back(sim, settle):
+    """This function checks whether any frame of a simulation is still being left for later (see importers.settled_frames)"""
+    names = importers.simulation_frames(sim)
+    return len(importers.settled_frames(sim, names, settle)) < len(names)
@@ -2,131 +2,216 @@
 This script creates plots to visualize the results of simulations of the differential growth model.
 Later on, it will also be used to visualize other models that work with discrete systems.
 
-This script starts by importing a csv file of the results, creates a plot, shows it, and then exports it as a png to the same folder it started in.
-Ideally, I would love to add a file search GUI, but I'm not sure if I'll get there.
-Will later add in support for visualizing where the iridophores were located, making spacetime plots, and making animations (once I add growth).
+Give it the simulation folders to plot on the command line, for example a whole day of runs:
+    python zebrafish_plot.py /home/chris/projects/difgrow_mc_sims/20_09_23/
+Each simulation gets an Images subfolder with a .png of every frame and an animation of the whole run.
+Running it again only renders the frames that are new or changed since the last run, so it can follow simulations that are still going.
+With --watch it keeps running and renders new frames as they're written, for watching simulations live.
+Run with --help to see all of the options.
 """
 
-import numpy as np
-import math
-import os
-import imageio
-import matplotlib.pyplot as plt
+import argparse
+
+from tools import importers, plotters, batch, profiling, framepack, stats, sweep, STPlotter, schema, watch
+
+
+def positive_int(text):
+    """This function checks a command line value that must be a whole number of at least 1"""
+    try:
+        value = int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError("must be a whole number, not " + repr(text))
+    if value < 1:
+        raise argparse.ArgumentTypeError("must be at least 1, not " + repr(text))
+    return value
+
+
+def cut_arg(text):
+    """This function checks a --space-time or --stats-cut value on the command line (see STPlotter.parse_cut), keeping it as written"""
+    if STPlotter.parse_cut(text) is None:
+        raise argparse.ArgumentTypeError("cuts look like 'row', 'col', 'row:<index>' or 'col:<index>', not " + repr(text))
+    return text
+
+
+def parse_args(argv = None):
+    """This function reads the command line options"""
+    parser = argparse.ArgumentParser(description = "Turn the .csv output of MC_Simulation into images and animations.")
+    parser.add_argument('paths', nargs = '+',
+                        help = "simulation folders, folders full of simulations (like a day of runs), or glob patterns of either")
+    parser.add_argument('-j', '--workers', type = positive_int, default = None,
+                        help = "number of worker processes (default: one per core, 1 runs everything in this process)")
+    parser.add_argument('--frames-per-task', type = positive_int, default = 50,
+                        help = "frames handed to a worker at a time, lower spreads big simulations over more workers (default: 50)")
+    parser.add_argument('--placement', choices = plotters.PLACEMENTS, default = batch.DEFAULT_SETTINGS['placement'],
+                        help = "where each frame sits in the final image size (default: %(default)s)")
+    parser.add_argument('--scale', type = int, default = batch.DEFAULT_SETTINGS['scale'],
+                        help = "pixels per cell along each side in the .png files (default: %(default)s)")
+    parser.add_argument('--styled', action = 'store_true',
+                        help = "save frames through matplotlib figures (much slower) instead of writing the pixels directly")
+    parser.add_argument('--max-size', metavar = 'ROWSxCOLS',
+                        help = "shrink the frames and animation to fit inside this many pixels (before --scale), for domains too big to look at whole")
+    parser.add_argument('--downsample', choices = ('mode', 'stride'), default = batch.DEFAULT_SETTINGS['downsample'],
+                        help = "how frames are shrunk for --max-size: 'mode' keeps the most common cell type of each block, "
+                               "'stride' just picks one cell and is faster (default: %(default)s)")
+    parser.add_argument('--cell-types', metavar = 'JSON',
+                        help = "load the cell codes, names and colors from this file instead of the built-in S/X/M ones (see tools/schema.py)")
+    parser.add_argument('--render-cache', metavar = 'DIR',
+                        help = "keep encoded frames in this folder (shared by every worker and run), so frames that are exactly alike, "
+                               "like the empty first frames of a sweep, are only encoded once")
+    parser.add_argument('--render-cache-size', type = float, default = batch.DEFAULT_SETTINGS['render_cache_mb'], metavar = 'MB',
+                        help = "the least recently used files of --render-cache are deleted past this size (default: %(default)s MB)")
+    parser.add_argument('--no-frame-cache', action = 'store_true',
+                        help = "don't keep a decoded copy of every .csv in each simulation's %s folder (saves disk space, but .csv files are parsed every time they're read)"
+                               % importers.FRAME_CACHE_DIR)
+    parser.add_argument('--force', action = 'store_true',
+                        help = "render every frame again, instead of only the frames that are new or changed since the last run")
+    parser.add_argument('--fps', type = int, default = batch.DEFAULT_SETTINGS['fps'],
+                        help = "frame rate of the animation (default: %(default)s)")
+    parser.add_argument('--animation', default = batch.DEFAULT_SETTINGS['animation'],
+                        help = "animation format: gif, or a video container like mp4 which compresses long runs much better (default: %(default)s)")
+    parser.add_argument('--no-delta', action = 'store_true',
+                        help = "store every frame of a .gif whole, instead of only the pixels that changed since the frame before (bigger and slower)")
+    parser.add_argument('--stride', type = int, default = batch.DEFAULT_SETTINGS['stride'],
+                        help = "only put every stride-th frame into the animation (default: %(default)s)")
+    parser.add_argument('--max-duration', type = float, default = batch.DEFAULT_SETTINGS['max_duration'],
+                        help = "longest the animation may last in seconds, frames are skipped evenly to fit")
+    parser.add_argument('--space-time', action = 'append', default = [], type = cut_arg, metavar = 'CUT',
+                        help = "also make a space-time plot along a cut of the final image: 'row' or 'col' for the middle one, "
+                               "or 'row:<index>' / 'col:<index>'. Can be given more than once")
+    parser.add_argument('--stats', action = 'store_true',
+                        help = "also save a table of pattern statistics of every frame (cell counts, domain size, stripes) to Images/%s" % stats.STATS_NAME)
+    parser.add_argument('--stats-cut', action = 'append', default = None, type = cut_arg, metavar = 'CUT',
+                        help = "cut of each frame to count stripes along, written like --space-time but taken in the frame itself (default: col)")
+    parser.add_argument('--min-stripe-width', type = int, default = batch.DEFAULT_SETTINGS['min_stripe_width'],
+                        help = "shortest run of cells counted as a stripe (default: %(default)s)")
+    parser.add_argument('--timings', metavar = 'FILE',
+                        help = "time every stage of every frame and save the timings to FILE (.json, or .csv for anything else)")
+    parser.add_argument('--profile', action = 'append', default = [], metavar = 'SIM',
+                        help = "run simulations whose folder name matches this pattern under cProfile (can be given more than once)")
+    parser.add_argument('--profile-dir', default = 'profiles',
+                        help = "folder the cProfile dumps are saved to, one per task (default: %(default)s)")
+    parser.add_argument('--montage', metavar = 'PNG',
+                        help = "instead of rendering every frame, make one montage of the whole sweep: a tile of each simulation laid out on a grid "
+                               "by the parameters in the folder names (like width_4_noise_0.1), saved to PNG with the layout next to it as .json")
+    parser.add_argument('--montage-source', choices = sweep.SOURCES, default = 'final',
+                        help = "what each tile shows, the final frame or a space-time plot along the first --space-time cut (default: %(default)s)")
+    parser.add_argument('--tile-size', metavar = 'ROWSxCOLS', default = '100x400',
+                        help = "each tile is shrunk to fit inside this many pixels (default: %(default)s)")
+    parser.add_argument('--grid-rows', metavar = 'PARAM', help = "parameter along the rows of the montage (default: the first in the names)")
+    parser.add_argument('--grid-cols', metavar = 'PARAM', help = "parameter along the columns of the montage (default: the second in the names)")
+    parser.add_argument('--watch', action = 'store_true',
+                        help = "keep running, rendering new frames as the simulations write them and updating a rolling preview animation "
+                               "and the space-time plots, until stopped with Ctrl+C. Needs --canvas")
+    parser.add_argument('--poll-interval', type = float, default = 5.0,
+                        help = "seconds between checks for new frames in --watch mode when inotify isn't available (default: %(default)s)")
+    parser.add_argument('--settle', type = float, default = 2.0,
+                        help = "in --watch mode, a .csv with no newer frame after it is only read once it hasn't changed for this many seconds (default: %(default)s)")
+    parser.add_argument('--preview-frames', type = int, default = None,
+                        help = "only animate the last this many frames (default: all of them, or 200 in --watch mode)")
+    parser.add_argument('--canvas', metavar = 'ROWSxCOLS',
+                        help = "size of the images, instead of the size of the last frame. Without it every frame is drawn again each time "
+                               "the domain grows, so it's needed in --watch mode")
+    parser.add_argument('--convert', action = 'store_true',
+                        help = "first pack each simulation's .csv files into one compact frame pack (%s), which is read instead of the .csv files from then on" % framepack.PACK_NAME)
+    return parser.parse_args(argv)
+
+
+def parse_size(text):
+    """This function reads a size written like 500x2000 into [rows, cols], or returns None if it isn't one"""
+    try:
+        size = [int(side) for side in text.lower().split('x')]
+    except ValueError:
+        return
+    if (len(size) != 2) or (min(size) < 1):
+        return
+    return size
+
+
+def main(argv = None):
+    args = parse_args(argv)
+    sims = batch.find_simulations(args.paths)
+    if (len(sims) == 0) and not args.watch:  # In watch mode they can show up later
+        print("Error: no simulations found")
+        return 1
+
+    convert_failed = []
+    if args.convert:
+        for sim in sims:
+            try:
+                packed = framepack.convert_simulation(sim)
+            except Exception as err:  # Its .csv files are still there, so it's rendered from them
+                convert_failed.append(sim)
+                print("Error: could not pack " + sim + " (%s: %s)" % (type(err).__name__, ' '.join(str(err).split())))
+                continue
+            if packed is None:
+                print("Nothing new to pack in " + sim)
+            else:
+                print("Packed " + packed)
+
+    max_size = None
+    if args.max_size is not None:
+        max_size = parse_size(args.max_size)
+        if max_size is None:
+            print("Error: --max-size should look like 500x2000, not " + args.max_size)
+            return 1
+
+    canvas_size = None
+    if args.canvas is not None:
+        canvas_size = parse_size(args.canvas)
+        if canvas_size is None:
+            print("Error: --canvas should look like 500x2000, not " + args.canvas)
+            return 1
+    if args.watch and (canvas_size is None):  # Or every frame would be drawn again each time the domain grows
+        print("Error: --watch needs --canvas set to the final size of the simulations")
+        return 1
+    preview_frames = args.preview_frames
+    if (preview_frames is None) and args.watch:
+        preview_frames = 200
+
+    cell_types = None
+    if args.cell_types is not None:
+        try:
+            cell_types = schema.load_schema(args.cell_types).config
+        except (OSError, ValueError, KeyError, TypeError) as err:
+            print("Error: could not load the cell types from " + args.cell_types + ": " + str(err))
+            return 1
+    plotters.use_schema(cell_types)
+
+    if args.montage is not None:
+        tile_size = parse_size(args.tile_size)
+        if tile_size is None:
+            print("Error: --tile-size should look like 100x400, not " + args.tile_size)
+            return 1
+        cut = STPlotter.parse_cut(args.space_time[0] if args.space_time else 'row')
+        if cut is None:
+            return 1
+        sweep.make_montage(sims, args.montage, tile_size, args.montage_source, cut, args.placement, args.grid_rows, args.grid_cols,
+                           styled = args.styled, workers = args.workers, cell_types = cell_types)
+        print("Saved " + args.montage)
+        return 0
+
+    settings = dict(batch.DEFAULT_SETTINGS, placement = args.placement, scale = args.scale, styled = args.styled, fps = args.fps,
+                    animation = args.animation.lstrip('.').lower(), stride = args.stride, max_duration = args.max_duration, delta = not args.no_delta,
+                    space_time = args.space_time, max_size = max_size, downsample = args.downsample, stats = args.stats,
+                    stats_cuts = args.stats_cut or batch.DEFAULT_SETTINGS['stats_cuts'], min_stripe_width = args.min_stripe_width,
+                    cell_types = cell_types, canvas_size = canvas_size, preview_frames = preview_frames,
+                    render_cache = args.render_cache, render_cache_mb = args.render_cache_size, frame_cache = not args.no_frame_cache)
+    recorder = profiling.Recorder(enabled = args.timings is not None)
+    if args.watch:
+        watch.watch(args.paths, workers = args.workers, frames_per_task = args.frames_per_task, settings = settings,
+                    interval = args.poll_interval, settle = args.settle, recorder = recorder)
+    else:
+        done = batch.run_batch(sims, workers = args.workers, frames_per_task = args.frames_per_task, settings = settings, force = args.force,
+                               recorder = recorder, profile_sims = args.profile, profile_dir = args.profile_dir)
+    if recorder.enabled:
+        recorder.print_summary()
+        recorder.save(args.timings)
+    if (not args.watch) and (len(done) < len(sims)):
+        return 1
+    if len(convert_failed) > 0:
+        return 1
+    return 0
 
-from tools import importers, plotters, STPlotter
 
 if __name__ == '__main__':
-
-    # Get information for importing
-    sims2itOver = []  # Will store path to directories you need to plot in here
-
-    ###########################################################################################################
-    # MUST UPDATE PATH TO SIMULATIONS TO RUN SCRIPT 
-    
-    basepath = '/home/chris/projects/difgrow_mc_sims/'
-    datepath = '20_09_23/'  # For now I'll have to change this manually. Will iterate through each sim run per day though
-    dirPath = basepath + datepath
-    ###########################################################################################################
-
-    for item in os.listdir(dirPath):
-        fullSimPath = dirPath + item
-        if os.path.isdir(fullSimPath):
-            sims2itOver.append(fullSimPath + "/")
-
-
-    # Loop over every simulation you want to analyze
-    for sim in sims2itOver:
-
-        # Create output directory
-        imgDir = sim + '/Images/'
-        if not os.path.exists(imgDir):
-            os.mkdir(imgDir)
-            img_list = importers.pull_images(sim)
-            final_img = importers.import_csv(sim + img_list[-1])
-            final_size = final_img.shape
-
-            # NOTE: Can uncomment below to form a space-time plot of the data. Read descritpions of functions before doing so
-            # Initialize ST plot
-#            rowCutSize = final_size[1]
-#            rowCutLoc = int(math.ceil(final_size[0] / 2))
-#            colCounter = 0
-#            space_time = STPlotter.stPlotEmptyTemplate(rdim = rowCutSize, cdim = len(img_list))
-
-            # Initialize animation
-            animatedList = []
-
-            # Fill output directory with images
-            for item in sorted(img_list):
-
-                # Import proper plot
-                sim_array = importers.import_csv(sim + item)
-                
-                # Add to Space-Time plot
-#                if sim_array.ndim == 2:
-#                    cut = sim_array[rowCutLoc, :]
-#                elif sim_array.ndim ==1:
-#                    cut = np.array([sim_array[rowCutLoc]])
-#                else:
-#                    cut = np.array([0])
-#                filledCut = STPlotter.fillSlice(cut, desired_size=rowCutSize)
-#                space_time[:, colCounter] = filledCut
-#                colCounter += 1
-
-                # Save as its own figure
-                image = plotters.plot_grow2D_right(sim_array, final_size) # Change this function depending on how you wish to plot the images.
-                save_name = item.replace('.csv', '.png')
-                save_name = imgDir + save_name
-                plt.figure()
-                plt.axes(frameon=False)
-                ax = plt.subplot(111)
-                ax.imshow(image)
-                ax.spines['right'].set_visible(False)
-                ax.spines['left'].set_visible(False)
-                ax.spines['top'].set_visible(False)
-                ax.spines['bottom'].set_visible(False)
-                ax.get_xaxis().set_visible(False)
-                ax.get_yaxis().set_visible(False)
-                ax.tick_params(bottom="off", left='off')
-                plt.savefig(save_name, bbox_inches='tight')
-                plt.close()
-
-                # Add to list of images for animation
-                animatedList.append((image * 255).astype(np.uint8))  
-
-#            finalST = STPlotter.plotST(space_time)
-#            STName = imgDir + '/SpaceTimePlot.png'
-#            plt.figure()
-#            plt.axes(frameon=False)
-#            ax = plt.subplot(111)
-#            ax.set_ylabel('Space')
-#            ax.set_xlabel('Time')
-#            ax.imshow(finalST)
-#            plt.savefig(STName, bbox_inches='tight')
-#            plt.close()
-
-            # Make animations
-            animName = imgDir + '/Animation.gif'
-            imageio.mimsave(animName, animatedList, fps = 50)
-
-            print("Done")
-
-
-        
-        
-        
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+    raise SystemExit(main())